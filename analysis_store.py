@@ -0,0 +1,171 @@
+import os
+import sqlite3
+
+# =====================================================================================
+#  Сохранённые результаты сравнения пар тензоров (sidecar-БД рядом с захватом)
+# =====================================================================================
+
+SIDECAR_SUFFIX = '.analysis.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Captures (
+    Source TEXT PRIMARY KEY, Fingerprint TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS PairResults (
+    Source1 TEXT NOT NULL, TensorID1 INTEGER NOT NULL, Size1 INTEGER,
+    Source2 TEXT NOT NULL, TensorID2 INTEGER NOT NULL, Size2 INTEGER,
+    MSE REAL NOT NULL, MaxAbsDiff REAL NOT NULL, Shape TEXT,
+    PRIMARY KEY (Source1, TensorID1, Source2, TensorID2)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS DigestSources (
+    Source TEXT PRIMARY KEY, Identity TEXT NOT NULL, FileSize INTEGER NOT NULL, MaxTensorID INTEGER
+);
+CREATE TABLE IF NOT EXISTS TensorDigests (
+    Source TEXT NOT NULL, TensorID INTEGER NOT NULL,
+    Name TEXT, Datatype INTEGER, SizeBytes INTEGER, Digest BLOB NOT NULL,
+    PRIMARY KEY (Source, TensorID)
+) WITHOUT ROWID;
+"""
+
+LOOKUP_QUERY = """
+    SELECT R.Source1, R.TensorID1, R.Source2, R.TensorID2, R.MSE, R.MaxAbsDiff
+    FROM temp.RequestedPairs Q
+    JOIN PairResults R
+      ON R.Source1 = Q.Source1 AND R.TensorID1 = Q.TensorID1
+     AND R.Source2 = Q.Source2 AND R.TensorID2 = Q.TensorID2
+     AND R.Size1 IS Q.Size1 AND R.Size2 IS Q.Size2
+"""
+
+
+DIGEST_LOOKUP_QUERY = """
+    SELECT D.Source, D.TensorID, D.Digest
+    FROM temp.RequestedDigests Q
+    JOIN TensorDigests D
+      ON D.Source = Q.Source AND D.TensorID = Q.TensorID
+     AND D.Name IS Q.Name AND D.Datatype IS Q.Datatype AND D.SizeBytes IS Q.SizeBytes
+"""
+
+
+def sidecar_path(capture_path):
+    return capture_path + SIDECAR_SUFFIX
+
+
+def capture_identity(capture_path):
+    """(устройство:inode, размер) файла захвата.
+
+    Дописывание в захват не меняет inode и не уменьшает размер, а TensorID
+    (AUTOINCREMENT) внутри файла не переиспользуются. inode переживает
+    перезапись файла на месте и может достаться новому файлу, поэтому
+    дайджесты дополнительно охраняются имя/тип/размером каждого тензора.
+    """
+    st = os.stat(capture_path)
+    return f"{st.st_dev}:{st.st_ino}", st.st_size
+
+
+def capture_fingerprint(capture_path):
+    """Размер и время изменения файла захвата: меняются при его перезаписи."""
+    st = os.stat(capture_path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+class AnalysisStore:
+    """Кэш результатов (MSE, max|diff|) по парам тензоров в отдельной БД.
+
+    Запись пары действительна, пока совпадают TensorID и DataSizeBytes обоих
+    тензоров, а файл-источник не был перезаписан (см. capture_fingerprint).
+    Ключи — (путь к захвату, TensorID), так что один sidecar может хранить
+    пары из разных файлов. Там же хранятся дайджесты содержимого тензоров:
+    они переживают дописывание в захват (см. capture_identity), а дайджест
+    тензора действителен, только пока совпадают его Name, Datatype и
+    DataSizeBytes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    @classmethod
+    def for_capture(cls, capture_path):
+        return cls(sidecar_path(capture_path))
+
+    def close(self):
+        self.conn.close()
+
+    def validate_source(self, source):
+        """Удаляет результаты источника, если файл захвата изменился с момента их записи."""
+        fingerprint = capture_fingerprint(source)
+        row = self.conn.execute("SELECT Fingerprint FROM Captures WHERE Source = ?", (source,)).fetchone()
+        if row is not None and row[0] == fingerprint:
+            return
+        with self.conn:
+            self.conn.execute("DELETE FROM PairResults WHERE Source1 = ? OR Source2 = ?", (source, source))
+            self.conn.execute("INSERT OR REPLACE INTO Captures (Source, Fingerprint) VALUES (?, ?)",
+                              (source, fingerprint))
+
+    def lookup(self, keys):
+        """keys — список (source1, id1, size1, source2, id2, size2).
+
+        Возвращает {(source1, id1, source2, id2): (mse, max_abs_diff)} для
+        действительных записей.
+        """
+        self.conn.execute("""CREATE TEMP TABLE IF NOT EXISTS RequestedPairs (
+            Source1 TEXT, TensorID1 INTEGER, Size1 INTEGER,
+            Source2 TEXT, TensorID2 INTEGER, Size2 INTEGER)""")
+        self.conn.execute("DELETE FROM temp.RequestedPairs")
+        self.conn.executemany("INSERT INTO temp.RequestedPairs VALUES (?, ?, ?, ?, ?, ?)", keys)
+        results = {(s1, id1, s2, id2): (mse, max_abs)
+                   for s1, id1, s2, id2, mse, max_abs in self.conn.execute(LOOKUP_QUERY)}
+        self.conn.execute("DELETE FROM temp.RequestedPairs")
+        return results
+
+    # --- Дайджесты содержимого тензоров ---
+
+    def validate_digests(self, source, max_tensor_id):
+        """Удаляет дайджесты источника, если файл захвата создан заново или стал меньше.
+
+        Уменьшение файла или MAX(TensorID) значит, что захват переписан на
+        месте: дописывание их только увеличивает.
+        """
+        identity, file_size = capture_identity(source)
+        row = self.conn.execute("SELECT Identity, FileSize, MaxTensorID FROM DigestSources WHERE Source = ?",
+                                (source,)).fetchone()
+        if row is not None and row == (identity, file_size, max_tensor_id):
+            return
+        with self.conn:
+            if (row is None or row[0] != identity or file_size < row[1]
+                    or (max_tensor_id or 0) < (row[2] or 0)):
+                self.conn.execute("DELETE FROM TensorDigests WHERE Source = ?", (source,))
+            self.conn.execute("INSERT OR REPLACE INTO DigestSources VALUES (?, ?, ?, ?)",
+                              (source, identity, file_size, max_tensor_id))
+
+    def hashed_tensors(self, source):
+        """{TensorID: (Name, Datatype, SizeBytes)} тензоров источника с посчитанным дайджестом."""
+        return {row[0]: row[1:] for row in self.conn.execute(
+            "SELECT TensorID, Name, Datatype, SizeBytes FROM TensorDigests WHERE Source = ?", (source,))}
+
+    def lookup_digests(self, keys):
+        """keys — список (source, tensor_id, name, datatype, size_bytes).
+
+        Возвращает {(source, tensor_id): digest} для дайджестов, записанных
+        для тензора с теми же Name, Datatype и DataSizeBytes.
+        """
+        self.conn.execute("""CREATE TEMP TABLE IF NOT EXISTS RequestedDigests (
+            Source TEXT, TensorID INTEGER, Name TEXT, Datatype INTEGER, SizeBytes INTEGER)""")
+        self.conn.execute("DELETE FROM temp.RequestedDigests")
+        self.conn.executemany("INSERT INTO temp.RequestedDigests VALUES (?, ?, ?, ?, ?)", keys)
+        results = {(source, tensor_id): digest
+                   for source, tensor_id, digest in self.conn.execute(DIGEST_LOOKUP_QUERY)}
+        self.conn.execute("DELETE FROM temp.RequestedDigests")
+        return results
+
+    def save_digests(self, rows):
+        """rows — список (source, tensor_id, name, datatype, size_bytes, digest)."""
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO TensorDigests VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def save(self, rows):
+        """rows — список (source1, id1, size1, source2, id2, size2, mse, max_abs_diff, shape)."""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO PairResults VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
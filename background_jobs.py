@@ -0,0 +1,187 @@
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import tkinter as tk
+from tkinter import ttk
+
+# =====================================================================================
+#  Фоновые задачи для вкладок: тяжёлая работа в потоках, результат — через root.after
+# =====================================================================================
+
+POLL_INTERVAL_MS = 50
+
+
+class Job:
+    """Одна фоновая задача. Функция задачи получает Job и может сообщать прогресс."""
+
+    def __init__(self, key, func, on_done, on_error, description):
+        self.key = key
+        self.func = func
+        self.on_done = on_done
+        self.on_error = on_error
+        self.description = description
+        self.progress = (0, 0)
+        self._cancel_event = threading.Event()
+        self._scheduler = None
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        self._cancel_event.set()
+
+    def report_progress(self, done, total):
+        """Вызывается из рабочего потока; UI обновится при следующем опросе очереди."""
+        self.progress = (done, total)
+        self._scheduler._events.put(('progress', self, None))
+
+
+class JobScheduler:
+    """Запускает задачи на пуле потоков и доставляет результаты в поток Tk.
+
+    Задачи с одинаковым ключом схлопываются: новая задача отменяет предыдущую,
+    а результат отменённой задачи молча отбрасывается.
+    """
+
+    def __init__(self, widget, max_workers=2):
+        self.widget = widget
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._events = queue.Queue()
+        self._active = {}
+        self._listeners = []
+        self._polling = False
+
+    def add_listener(self, callback):
+        """callback(event, job) вызывается в потоке Tk на 'started', 'progress' и 'finished'."""
+        self._listeners.append(callback)
+
+    def submit(self, key, func, on_done=None, on_error=None, description=""):
+        self.cancel(key)
+        job = Job(key, func, on_done, on_error, description)
+        job._scheduler = self
+        self._active[key] = job
+        self._notify('started', job)
+        self._executor.submit(self._run, job)
+        self._ensure_polling()
+        return job
+
+    def cancel(self, key):
+        job = self._active.pop(key, None)
+        if job is not None:
+            job.cancel()
+            self._notify('finished', job)
+
+    def cancel_all(self):
+        for key in list(self._active):
+            self.cancel(key)
+
+    def is_running(self, key):
+        return key in self._active
+
+    def active_jobs(self):
+        return list(self._active.values())
+
+    def shutdown(self):
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job):
+        if job.cancelled:
+            return
+        try:
+            result = job.func(job)
+        except Exception as e:
+            self._events.put(('error', job, e))
+        else:
+            self._events.put(('done', job, result))
+
+    def _ensure_polling(self):
+        if not self._polling:
+            self._polling = True
+            self.widget.after(POLL_INTERVAL_MS, self._poll)
+
+    def _poll(self):
+        try:
+            while True:
+                try:
+                    kind, job, payload = self._events.get_nowait()
+                except queue.Empty:
+                    break
+                # Результаты отменённых или вытесненных задач отбрасываются
+                if job.cancelled or self._active.get(job.key) is not job:
+                    continue
+                if kind == 'progress':
+                    self._call(self._notify, 'progress', job)
+                    continue
+                del self._active[job.key]
+                self._call(self._notify, 'finished', job)
+                if kind == 'done' and job.on_done:
+                    self._call(job.on_done, payload)
+                elif kind == 'error' and job.on_error:
+                    self._call(job.on_error, payload)
+        finally:
+            # Опрос продолжается, даже если обработчик упал: иначе зависнут все задачи планировщика
+            if self._active:
+                self.widget.after(POLL_INTERVAL_MS, self._poll)
+            else:
+                self._polling = False
+
+    def _call(self, callback, *args):
+        """Вызывает обработчик в потоке Tk; исключение уходит в report_callback_exception, как у Tk."""
+        try:
+            callback(*args)
+        except Exception:
+            self.widget.report_callback_exception(*sys.exc_info())
+
+    def _notify(self, event, job):
+        for callback in self._listeners:
+            callback(event, job)
+
+
+class JobStatusBar(ttk.Frame):
+    """Полоса прогресса с кнопкой отмены для задач одного JobScheduler."""
+
+    def __init__(self, parent, scheduler):
+        super().__init__(parent)
+        self.scheduler = scheduler
+        self._current = None
+
+        self.status_var = tk.StringVar(value="Ready.")
+        ttk.Label(self, textvariable=self.status_var, anchor='w').pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.cancel_button = ttk.Button(self, text="Cancel", command=self._cancel, state='disabled')
+        self.cancel_button.pack(side=tk.RIGHT, padx=(5, 0))
+        self.progress = ttk.Progressbar(self, mode='determinate', length=200)
+        self.progress.pack(side=tk.RIGHT, padx=(5, 0))
+
+        scheduler.add_listener(self._on_job_event)
+
+    def _on_job_event(self, event, job):
+        if event == 'finished':
+            if job is not self._current:
+                return
+            remaining = self.scheduler.active_jobs()
+            if not remaining:
+                self._current = None
+                self.progress.stop()
+                self.progress.config(mode='determinate', value=0)
+                self.status_var.set("Cancelled." if job.cancelled else "Ready.")
+                self.cancel_button.config(state='disabled')
+                return
+            job, event = remaining[-1], 'started'
+        self._current = job
+        self.cancel_button.config(state='normal')
+        done, total = job.progress
+        if total:
+            self.progress.stop()
+            self.progress.config(mode='determinate', maximum=total, value=done)
+            self.status_var.set(f"{job.description} {done}/{total}")
+        elif event == 'started':
+            self.progress.config(mode='indeterminate')
+            self.progress.start(15)
+            self.status_var.set(f"{job.description}...")
+
+    def _cancel(self):
+        self.scheduler.cancel_all()
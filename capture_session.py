@@ -0,0 +1,200 @@
+import bisect
+import os
+import threading
+
+from tensor_db import (BLOB_CHUNK_SIZE, DEFAULT_CACHE_BYTES, DEFAULT_DB_PATH, TENSOR_PAIRS_QUERY,
+                       TensorDatabase, get_database)
+
+# =====================================================================================
+#  Сессия из нескольких файлов захвата: ATTACH к соединению и сквозные RecordID/TensorID
+# =====================================================================================
+
+# SQLite по умолчанию разрешает не больше 10 подключённых через ATTACH баз
+MAX_ATTACHED_CAPTURES = 10
+# Глобальный TensorID: номер захвата в старших битах, TensorID файла — в младших
+CAPTURE_ID_SHIFT = 40
+LOCAL_ID_MASK = (1 << CAPTURE_ID_SHIFT) - 1
+
+# Запросы к схеме конкретного захвата; сдвиги RecordID и TensorID подставляются
+# параметрами, так что строки приходят из SQLite уже переназначенными.
+CAPTURE_NODES_COUNT_QUERY = "SELECT COUNT(*) FROM {schema}.Nodes"
+CAPTURE_NODES_QUERY = "SELECT Name, Start, End, RecordID + ?, SeqNum FROM {schema}.Nodes ORDER BY RecordID, SeqNum"
+CAPTURE_RECORD_RANGE_QUERY = "SELECT MIN(RecordID), MAX(RecordID) FROM {schema}.Nodes"
+CAPTURE_TENSOR_METADATA_QUERY = """
+    SELECT T.Name, N.RecordID + ?, T.ID + ? as TensorID, T.Datatype, T.NumDims,
+           T.Shape0, T.Shape1, T.Shape2, T.Shape3, T.Shape4, T.DataSizeBytes
+    FROM {schema}.Tensors T
+    JOIN {schema}.TensorMap TM ON T.ID = TM.TensorID
+    JOIN {schema}.Nodes N ON TM.NodeID = N.id
+    WHERE T.Name IS NOT NULL AND T.Name != ''
+    ORDER BY N.RecordID, T.Name
+"""
+
+
+def schema_name(capture_index):
+    """Имя схемы захвата в соединении: main для основного, capN для подключённых."""
+    return 'main' if capture_index == 0 else f'cap{capture_index}'
+
+
+def global_tensor_id(capture_index, tensor_id):
+    return (capture_index << CAPTURE_ID_SHIFT) | tensor_id
+
+
+def split_tensor_id(tensor_id):
+    """(номер захвата, TensorID в файле захвата) для глобального TensorID."""
+    return tensor_id >> CAPTURE_ID_SHIFT, tensor_id & LOCAL_ID_MASK
+
+
+class CaptureSession(TensorDatabase):
+    """Несколько файлов захвата как одна база для вкладок приложения.
+
+    Основной захват открывается как обычная TensorDatabase (схема main),
+    остальные подключаются через ATTACH к соединению каждого потока, и
+    Nodes/метаданные тензоров всех захватов читаются одним соединением.
+    RecordID каждого подключённого захвата сдвигаются на record_offsets[i]
+    так, чтобы не пересекаться с уже загруженными, а TensorID кодируют номер
+    захвата в старших битах (см. global_tensor_id). BLOB'ы читаются через
+    TensorDatabase своего файла: у каждого захвата может быть своя раскладка.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, cache_bytes=DEFAULT_CACHE_BYTES):
+        super().__init__(path, cache_bytes)
+        self.captures = [self]
+        self.record_offsets = [0]
+        # Первый сквозной RecordID каждого захвата — по нему RecordID находит свой захват
+        self.record_starts = [float('-inf')]
+        self._next_record_id = None
+        self._attach_lock = threading.Lock()
+        # Путь захвата под каждой схемой (None — основной); кортеж заменяется целиком при
+        # каждом изменении, так что соединение потока сверяет его с подключённым по is
+        self._schema_paths = (None,)
+
+    @property
+    def connection(self):
+        conn = super().connection
+        # Соединение потока приводится к текущему набору захватов: схема, под которой
+        # подключён другой файл (например, после неудачного attach), переподключается
+        wanted = self._schema_paths
+        attached = getattr(self._local, 'attached', (None,))
+        if attached is wanted:
+            return conn
+        for index in range(1, max(len(attached), len(wanted))):
+            have = attached[index] if index < len(attached) else None
+            want = wanted[index] if index < len(wanted) else None
+            if have == want:
+                continue
+            if have is not None:
+                conn.execute(f"DETACH DATABASE {schema_name(index)}")
+            if want is not None:
+                conn.execute(f"ATTACH DATABASE ? AS {schema_name(index)}", (f"file:{want}?mode=ro",))
+        self._local.attached = wanted
+        return conn
+
+    def _record_range(self, capture_index):
+        sql = CAPTURE_RECORD_RANGE_QUERY.format(schema=schema_name(capture_index))
+        return self.fetchone('record_range', sql)
+
+    def attach(self, path):
+        """Добавляет файл захвата в сессию и возвращает его номер.
+
+        RecordID нового захвата сдвигаются так, чтобы начинаться сразу после
+        максимального RecordID уже загруженных.
+        """
+        key = os.path.abspath(path)
+        if not os.path.exists(key):
+            raise FileNotFoundError(f"No such capture file: '{path}'")
+        with self._attach_lock:
+            if any(os.path.abspath(capture.path) == key for capture in self.captures):
+                raise ValueError(f"'{path}' is already part of the session.")
+            if len(self.captures) - 1 >= MAX_ATTACHED_CAPTURES:
+                raise ValueError(f"At most {MAX_ATTACHED_CAPTURES} databases can be added.")
+            if self._next_record_id is None:
+                _, max_record = self._record_range(0)
+                self._next_record_id = (max_record or 0) + 1
+            index = len(self.captures)
+            self.captures.append(get_database(path))
+            self.record_offsets.append(0)
+            self.record_starts.append(self._next_record_id)
+            self._schema_paths = self._schema_paths + (key,)
+            try:
+                min_record, max_record = self._record_range(index)
+            except Exception:
+                # Не захват (или не читается): соединения потоков, успевшие его
+                # подключить, отсоединят или переподключат схему при следующем запросе
+                self.captures.pop()
+                self.record_offsets.pop()
+                self.record_starts.pop()
+                self._schema_paths = self._schema_paths[:index]
+                self.connection  # своё соединение отсоединяет схему сразу
+                raise
+            if min_record is not None:
+                self.record_offsets[index] = self._next_record_id - min_record
+                self._next_record_id = max_record + self.record_offsets[index] + 1
+        return index
+
+    # --- Запросы по всем захватам ---
+
+    def _node_queries(self):
+        return [(CAPTURE_NODES_COUNT_QUERY.format(schema=schema_name(index)),
+                 CAPTURE_NODES_QUERY.format(schema=schema_name(index)), (offset,))
+                for index, offset in enumerate(self.record_offsets)]
+
+    def fetch_nodes(self):
+        rows = []
+        for _, sql, params in self._node_queries():
+            rows.extend(self.fetchall('nodes', sql, params))
+        return rows
+
+    def fetch_tensor_metadata(self):
+        rows = []
+        for index, offset in enumerate(self.record_offsets):
+            sql = CAPTURE_TENSOR_METADATA_QUERY.format(schema=schema_name(index))
+            rows.extend(self.fetchall('tensor_metadata', sql, (offset, global_tensor_id(index, 0))))
+        return rows
+
+    def capture_of_record(self, record_id):
+        """(номер захвата, RecordID в его файле) для сквозного RecordID."""
+        index = bisect.bisect_right(self.record_starts, record_id) - 1
+        return index, record_id - self.record_offsets[index]
+
+    def fetch_tensor_pairs(self, record1, record2):
+        # Рекорды из разных захватов соединяются через схемы, подключённые ATTACH
+        (index1, local1), (index2, local2) = self.capture_of_record(record1), self.capture_of_record(record2)
+        sql = TENSOR_PAIRS_QUERY.format(left=schema_name(index1), right=schema_name(index2))
+        return self.fetchall('tensor_pairs', sql, (global_tensor_id(index1, 0), global_tensor_id(index2, 0),
+                                                   local1, local2))
+
+    # --- BLOB'ы: через TensorDatabase файла захвата ---
+
+    def database_for(self, tensor_id):
+        capture_index, local_id = split_tensor_id(tensor_id)
+        if capture_index == 0:
+            return self, local_id
+        return self.captures[capture_index], local_id
+
+    def fetch_blob(self, tensor_id):
+        db, local_id = self.database_for(tensor_id)
+        if db is self:
+            return super().fetch_blob(local_id)
+        return db.fetch_blob(local_id)
+
+    def cache_tensor(self, tensor_id, tensor):
+        db, _ = self.database_for(tensor_id)
+        if db.zero_copy_payloads:
+            return tensor
+        return self.tensor_cache.put(tensor_id, tensor)
+
+    def iter_blobs(self, tensor_ids, chunk_size=BLOB_CHUNK_SIZE):
+        """(глобальный ID, BLOB) по захватам, внутри захвата — в порядке возрастания ID."""
+        by_capture = {}
+        for tensor_id in set(tensor_ids):
+            capture_index, local_id = split_tensor_id(tensor_id)
+            by_capture.setdefault(capture_index, []).append(local_id)
+        for capture_index in sorted(by_capture):
+            local_ids = by_capture[capture_index]
+            if capture_index == 0:
+                blobs = super().iter_blobs(local_ids, chunk_size)
+            else:
+                blobs = self.captures[capture_index].iter_blobs(local_ids, chunk_size)
+            for local_id, blob in blobs:
+                yield global_tensor_id(capture_index, local_id), blob
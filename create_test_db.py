@@ -2,9 +2,12 @@ import sqlite3
 import random
 import os
 import struct
+import sys
 import numpy as np
 
 DB_NAME = "debug.db"
+# Раздельная раскладка: метаданные в Tensors, BLOB'ы в TensorData (см. db_maintenance.py)
+SPLIT_PAYLOADS = "--split-payloads" in sys.argv
 
 if os.path.exists(DB_NAME):
     os.remove(DB_NAME)
@@ -20,12 +23,23 @@ CREATE TABLE IF NOT EXISTS Nodes (
     Name TEXT, Start REAL, End REAL
 )''')
 
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS Tensors (
-    ID INTEGER PRIMARY KEY AUTOINCREMENT, Datatype INTEGER, Format INTEGER, NumDims INTEGER,
-    Shape0 INTEGER, Shape1 INTEGER, Shape2 INTEGER, Shape3 INTEGER, Shape4 INTEGER,
-    ElementsSize INTEGER, Data BLOB, DataSizeBytes INTEGER, Name TEXT
-)''')
+if SPLIT_PAYLOADS:
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Tensors (
+        ID INTEGER PRIMARY KEY AUTOINCREMENT, Datatype INTEGER, Format INTEGER, NumDims INTEGER,
+        Shape0 INTEGER, Shape1 INTEGER, Shape2 INTEGER, Shape3 INTEGER, Shape4 INTEGER,
+        ElementsSize INTEGER, DataSizeBytes INTEGER, Name TEXT
+    )''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS TensorData (ID INTEGER PRIMARY KEY, Data BLOB)
+    ''')
+else:
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS Tensors (
+        ID INTEGER PRIMARY KEY AUTOINCREMENT, Datatype INTEGER, Format INTEGER, NumDims INTEGER,
+        Shape0 INTEGER, Shape1 INTEGER, Shape2 INTEGER, Shape3 INTEGER, Shape4 INTEGER,
+        ElementsSize INTEGER, Data BLOB, DataSizeBytes INTEGER, Name TEXT
+    )''')
 
 cursor.execute('''
 CREATE TABLE IF NOT EXISTS TensorMap (
@@ -106,13 +120,23 @@ for record_id in range(1, records_to_generate + 1):
         # CHANGE 2: The tensor name will now be very descriptive thanks to the layer name
         tensor_name = f"{layer_name}_output"
         
-        cursor.execute(
-            """INSERT INTO Tensors 
-               (Datatype, Format, NumDims, Shape0, Shape1, Shape2, Shape3, Shape4, ElementsSize, Data, DataSizeBytes, Name) 
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (0, -1, num_dims, *db_shape, element_size, blob_data, data_size_bytes, tensor_name)
-        )
-        current_tensor_id = cursor.lastrowid
+        if SPLIT_PAYLOADS:
+            cursor.execute(
+                """INSERT INTO Tensors 
+                   (Datatype, Format, NumDims, Shape0, Shape1, Shape2, Shape3, Shape4, ElementsSize, DataSizeBytes, Name) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (0, -1, num_dims, *db_shape, element_size, data_size_bytes, tensor_name)
+            )
+            current_tensor_id = cursor.lastrowid
+            cursor.execute("INSERT INTO TensorData (ID, Data) VALUES (?, ?)", (current_tensor_id, blob_data))
+        else:
+            cursor.execute(
+                """INSERT INTO Tensors 
+                   (Datatype, Format, NumDims, Shape0, Shape1, Shape2, Shape3, Shape4, ElementsSize, Data, DataSizeBytes, Name) 
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (0, -1, num_dims, *db_shape, element_size, blob_data, data_size_bytes, tensor_name)
+            )
+            current_tensor_id = cursor.lastrowid
 
         # --- Link them in TensorMap ---
         cursor.execute(
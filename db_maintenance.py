@@ -0,0 +1,174 @@
+import argparse
+import os
+import sqlite3
+
+from tensor_db import NODES_QUERY, TENSOR_METADATA_QUERY, TENSOR_PAIRS_QUERY, PAYLOAD_FILE_SUFFIX
+
+# =====================================================================================
+#  Обслуживание БД захвата: индексы под запросы приложения, ANALYZE и проверка планов
+# =====================================================================================
+
+# Покрывающие индексы: загрузчики читают только индекс и не трогают строки
+# таблиц (для Tensors это значит — не листают страницы с BLOB'ами).
+INDEXES = {
+    'idx_nodes_record_seq':
+        "CREATE INDEX IF NOT EXISTS idx_nodes_record_seq ON Nodes (RecordID, SeqNum, Name, Start, End)",
+    'idx_tensormap_node':
+        "CREATE INDEX IF NOT EXISTS idx_tensormap_node ON TensorMap (NodeID, TensorID)",
+    'idx_tensormap_tensor':
+        "CREATE INDEX IF NOT EXISTS idx_tensormap_tensor ON TensorMap (TensorID, NodeID)",
+    'idx_tensors_id_meta':
+        "CREATE INDEX IF NOT EXISTS idx_tensors_id_meta ON Tensors "
+        "(ID, Name, Datatype, NumDims, Shape0, Shape1, Shape2, Shape3, Shape4, DataSizeBytes)",
+    # Поиск пары по имени и форме в самосоединении TENSOR_PAIRS_QUERY
+    'idx_tensors_name_shape':
+        "CREATE INDEX IF NOT EXISTS idx_tensors_name_shape ON Tensors "
+        "(Name, Datatype, Shape0, Shape1, Shape2, Shape3, Shape4, DataSizeBytes, NumDims, ID)",
+}
+
+# Запросы загрузчиков и индексы, которые они должны использовать после оптимизации
+CHECKED_QUERIES = {
+    'Gantt nodes': (NODES_QUERY, {'idx_nodes_record_seq'}),
+    'Tensor metadata': (TENSOR_METADATA_QUERY, {'idx_tensors_id_meta', 'idx_nodes_record_seq',
+                                                'idx_tensormap_node', 'idx_tensormap_tensor'}),
+    'Tensor pairs': (TENSOR_PAIRS_QUERY.format(left='main', right='main'),
+                     {'idx_tensors_name_shape', 'idx_nodes_record_seq', 'idx_tensormap_node'}),
+}
+
+
+def explain_query_plan(conn, sql, params=()):
+    """Строки 'detail' из EXPLAIN QUERY PLAN."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def check_query_plans(conn):
+    """Для каждого загрузчика возвращает (план, использованные индексы, есть ли полный скан таблицы).
+
+    Полным сканом считается 'SCAN <table>' без индекса; сканы покрывающего
+    индекса ('SCAN ... USING COVERING INDEX') допустимы.
+    """
+    report = {}
+    for name, (sql, expected) in CHECKED_QUERIES.items():
+        # План не зависит от значений параметров: подставляем NULL
+        plan = explain_query_plan(conn, sql, (None,) * sql.count('?'))
+        used = {index for index in expected if any(index in line for line in plan)}
+        full_scan = any(line.startswith('SCAN') and 'INDEX' not in line for line in plan)
+        report[name] = (plan, used, full_scan)
+    return report
+
+
+def format_plan_report(report):
+    lines = []
+    for name, (plan, used, full_scan) in report.items():
+        status = "full table scan!" if full_scan else "indexed"
+        lines.append(f"{name}: {status}; indexes: {', '.join(sorted(used)) or 'none'}")
+        lines.extend(f"    {line}" for line in plan)
+    return "\n".join(lines)
+
+
+# Раздельная раскладка: Tensors хранит только метаданные (узкие строки, без
+# overflow-страниц), а BLOB'ы лежат в TensorData с тем же ID.
+SPLIT_TENSORS_SCHEMA = """
+CREATE TABLE Tensors (
+    ID INTEGER PRIMARY KEY AUTOINCREMENT, Datatype INTEGER, Format INTEGER, NumDims INTEGER,
+    Shape0 INTEGER, Shape1 INTEGER, Shape2 INTEGER, Shape3 INTEGER, Shape4 INTEGER,
+    ElementsSize INTEGER, DataSizeBytes INTEGER, Name TEXT
+)"""
+TENSOR_DATA_SCHEMA = "CREATE TABLE TensorData (ID INTEGER PRIMARY KEY, Data BLOB)"
+# Выравнивание BLOB'ов в файле payload: смещение кратно строке кэша, так что
+# представления NumPy всегда выровнены под любой тип элементов.
+PAYLOAD_ALIGNMENT = 64
+TENSOR_METADATA_COLUMNS = ("ID, Datatype, Format, NumDims, Shape0, Shape1, Shape2, Shape3, Shape4, "
+                           "ElementsSize, DataSizeBytes, Name")
+
+
+def _write_payload_file(conn, payload_path):
+    """Выписывает BLOB'ы из src.Tensors подряд в файл и проставляет Tensors.DataOffset."""
+    offsets = []
+    offset = 0
+    with open(payload_path, 'wb') as f:
+        for tensor_id, data in conn.execute("SELECT ID, Data FROM src.Tensors ORDER BY ID"):
+            padding = -offset % PAYLOAD_ALIGNMENT
+            if padding:
+                f.write(b'\0' * padding)
+                offset += padding
+            data = data or b''
+            f.write(data)
+            offsets.append((offset, len(data), tensor_id))
+            offset += len(data)
+    conn.executemany("UPDATE main.Tensors SET DataOffset = ?, DataSizeBytes = ? WHERE ID = ?", offsets)
+
+
+def split_payloads(src_path, dst_path, payload_file=False):
+    """Копирует захват в новый файл с раздельной раскладкой.
+
+    По умолчанию BLOB'ы переносятся в таблицу TensorData; с payload_file=True —
+    в плоский файл '<dst_path>.payload', а Tensors получает столбец DataOffset
+    (такой захват TensorDatabase читает через mmap без копирования).
+    Исходный файл открывается только на чтение и не меняется. Nodes и
+    TensorMap копируются как есть (со своими схемами), после чего на новом
+    файле выполняется optimize_database().
+    """
+    payload_path = dst_path + PAYLOAD_FILE_SUFFIX
+    for path in (dst_path, payload_path) if payload_file else (dst_path,):
+        if os.path.exists(path):
+            raise FileExistsError(f"'{path}' already exists.")
+    conn = sqlite3.connect(f"file:{os.path.abspath(dst_path)}", uri=True)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (f"file:{os.path.abspath(src_path)}?mode=ro",))
+        with conn:
+            for table in ('Nodes', 'TensorMap'):
+                (create_sql,) = conn.execute(
+                    "SELECT sql FROM src.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+                conn.execute(create_sql)
+                conn.execute(f"INSERT INTO main.{table} SELECT * FROM src.{table}")
+            conn.execute(SPLIT_TENSORS_SCHEMA)
+            conn.execute(f"INSERT INTO main.Tensors ({TENSOR_METADATA_COLUMNS}) "
+                         f"SELECT {TENSOR_METADATA_COLUMNS} FROM src.Tensors ORDER BY ID")
+            if payload_file:
+                conn.execute("ALTER TABLE main.Tensors ADD COLUMN DataOffset INTEGER")
+                _write_payload_file(conn, payload_path)
+            else:
+                conn.execute(TENSOR_DATA_SCHEMA)
+                conn.execute("INSERT INTO main.TensorData (ID, Data) SELECT ID, Data FROM src.Tensors ORDER BY ID")
+        conn.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+    return optimize_database(dst_path)
+
+
+def optimize_database(path):
+    """Создаёт индексы, собирает статистику (ANALYZE) и возвращает отчёт по планам запросов.
+
+    Открывает отдельное соединение на запись; общие read-only соединения
+    TensorDatabase сами подхватят новую схему при следующем запросе.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            for name, sql in INDEXES.items():
+                # Индекс, созданный прежней версией с другим набором столбцов, пересоздаётся
+                row = conn.execute("SELECT sql FROM sqlite_master WHERE type = 'index' AND name = ?",
+                                   (name,)).fetchone()
+                if row is not None and row[0] != sql.replace("IF NOT EXISTS ", ""):
+                    conn.execute(f"DROP INDEX {name}")
+                conn.execute(sql)
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+        return check_query_plans(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimize a capture database or convert its layout.")
+    parser.add_argument('db', nargs='?', default='debug.db', help="capture database (default: debug.db)")
+    parser.add_argument('--split-payloads', metavar='OUTPUT',
+                        help="write a copy with tensor payloads moved to a separate TensorData table")
+    parser.add_argument('--payload-file', action='store_true',
+                        help="with --split-payloads: store payloads in a flat OUTPUT.payload file for mmap access")
+    args = parser.parse_args()
+    if args.split_payloads:
+        print(format_plan_report(split_payloads(args.db, args.split_payloads, payload_file=args.payload_file)))
+    else:
+        print(format_plan_report(optimize_database(args.db)))
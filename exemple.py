@@ -13,6 +13,8 @@ class StandaloneTensorViewer(ttk.Frame):
         self.tensor = tensor_data
         self.current_slice = tensor_data # В этом примере у нас сразу 2D срез
         self.is_drawing = False
+        self._pending_update = None
+        self._rendered_limits = None
 
         # --- UI Элементы ---
         self.fig = Figure(figsize=(6, 6), dpi=100)
@@ -72,6 +74,14 @@ class StandaloneTensorViewer(ttk.Frame):
         # Флаг is_drawing предотвращает бесконечную рекурсию, т.к. _update_view тоже вызывает draw()
         if self.is_drawing:
             return
+        # Пулинг пересчитывается только если вид действительно изменился, и не
+        # внутри draw: обновление откладывается и схлопывается в одно
+        if (self.ax.get_xlim(), self.ax.get_ylim()) == self._rendered_limits or self._pending_update:
+            return
+        self._pending_update = self.after_idle(self._deferred_update)
+
+    def _deferred_update(self):
+        self._pending_update = None
         self._update_view(is_new_tensor=False)
 
     def _adaptive_pool(self, data, pool_size):
@@ -143,6 +153,7 @@ class StandaloneTensorViewer(ttk.Frame):
             self.ax.set_ylim(ylim)
 
         self.canvas.draw()
+        self._rendered_limits = (self.ax.get_xlim(), self.ax.get_ylim())
         self.is_drawing = False
 
 
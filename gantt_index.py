@@ -0,0 +1,96 @@
+import numpy as np
+
+# =====================================================================================
+#  Индекс интервалов времени для поиска задач диаграммы Ганта
+# =====================================================================================
+
+
+def sort_by_group(group, key):
+    """Перестановка, сортирующая по (group, key).
+
+    Два устойчивых argsort по одному ключу заметно быстрее np.lexsort на
+    миллионах элементов; уже отсортированный вход распознаётся за один проход.
+    """
+    same = group[1:] == group[:-1]
+    if np.all(group[1:] >= group[:-1]) and np.all(key[1:][same] >= key[:-1][same]):
+        return np.arange(len(group))
+    order = np.argsort(key, kind='stable')
+    return order[np.argsort(group[order], kind='stable')]
+
+
+class IntervalIndex:
+    """Интервалы [start, end], разбитые на группы (например, полоса и строка рекорда).
+
+    Внутри группы интервалы отсортированы по началу, и для них хранится
+    накопленный максимум концов. Интервалы, пересекающие [t0, t1], — это
+    те, у кого start <= t1 и end >= t0: первое условие задаёт префикс группы
+    (бинарный поиск по началам), а накопленный максимум концов монотонен,
+    поэтому второй бинарный поиск отбрасывает начало префикса, где ни один
+    интервал не доходит до t0. Проверяются только оставшиеся кандидаты.
+
+    presorted=True означает, что вход уже отсортирован по (group, start):
+    тогда start и end не копируются, а запросы возвращают индексы входа как
+    есть. Номера групп по элементам не хранятся — только границы групп.
+    """
+
+    def __init__(self, group, start, end, presorted=False):
+        group = np.asarray(group, dtype=np.int64)
+        start = np.asarray(start, dtype=np.float64)
+        end = np.asarray(end, dtype=np.float64)
+        if presorted:
+            # Индексы входа и есть ответы запросов
+            self.order = None
+        else:
+            order = sort_by_group(group, start)
+            self.order = order
+            group, start, end = group[order], start[order], end[order]
+        self.start, self.end = start, end
+        n = len(end)
+        first = np.ones(n, dtype=bool)
+        first[1:] = group[1:] != group[:-1]
+        group_starts = np.flatnonzero(first)
+        # Непустые группы по возрастанию и начало каждой; последний элемент — n
+        self.groups = group[group_starts]
+        self.group_starts = np.append(group_starts, n)
+        # Накопленный максимум концов внутри групп одним проходом: концы
+        # заменяются рангами, а номер группы сдвигает ранги так, что группы
+        # не смешиваются (целые числа, поэтому без потери точности)
+        by_end = np.argsort(end, kind='stable')
+        rank = np.empty(n, dtype=np.int64)
+        rank[by_end] = np.arange(n)
+        group_offset = (np.cumsum(first) - 1) * n
+        self.max_end = end[by_end[np.maximum.accumulate(rank + group_offset) - group_offset]] if n else end.copy()
+
+    def __len__(self):
+        return len(self.end)
+
+    def _group_bounds(self, group):
+        i = int(np.searchsorted(self.groups, group))
+        if i == len(self.groups) or self.groups[i] != group:
+            return 0, 0
+        return int(self.group_starts[i]), int(self.group_starts[i + 1])
+
+    def _original(self, found):
+        return found if self.order is None else self.order[found]
+
+    def _overlapping_in_group(self, group, t0, t1):
+        lo, hi = self._group_bounds(group)
+        stop = lo + int(np.searchsorted(self.start[lo:hi], t1, side='right'))
+        first = lo + int(np.searchsorted(self.max_end[lo:stop], t0, side='left'))
+        return first + np.flatnonzero(self.end[first:stop] >= t0)
+
+    def overlapping(self, t0, t1, group=None):
+        """Исходные индексы интервалов, пересекающих [t0, t1] (в группе или во всех группах)."""
+        groups = self.groups if group is None else (group,)
+        found = [self._overlapping_in_group(g, t0, t1) for g in groups]
+        found = np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+        return self._original(found)
+
+    def at(self, t, group, tolerance=0.0):
+        """Исходный индекс интервала группы, ближайшего к моменту t (в пределах tolerance), или None."""
+        candidates = self._overlapping_in_group(group, t - tolerance, t + tolerance)
+        if not len(candidates):
+            return None
+        # Внутри интервала расстояние нулевое
+        distance = np.maximum(self.start[candidates] - t, 0) + np.maximum(t - self.end[candidates], 0)
+        return int(self._original(candidates[np.argmin(distance)]))
@@ -0,0 +1,296 @@
+import numpy as np
+
+from gantt_index import IntervalIndex, sort_by_group
+from tensor_db import NodeColumns
+
+# =====================================================================================
+#  Разметка диаграммы Ганта в массивах NumPy (мировые координаты, масштаб 1)
+# =====================================================================================
+
+PADDING, LEFT_MARGIN, TIMELINE_WIDTH = 60, 200, 2500
+SUB_BAR_HEIGHT, SUB_BAR_PADDING = 20, 5
+LEGEND_TOP_MARGIN, LEGEND_ITEM_HEIGHT = 40, 25
+NUM_TICKS = 10
+
+# Уровни детализации: строка рекорда на экране не тоньше MIN_ROW_PX (иначе
+# соседние полосы объединяются в группы по 2**k), а бары уже пикселя сливаются
+MIN_ROW_PX = 3
+LOD_CACHE_LEVELS = 8
+
+
+class BarSet:
+    """Бары одного уровня детализации, отсортированные по (группа полос, строка, x0).
+
+    На полном уровне группа — это одна полоса и count == 1; на грубых уровнях
+    бар — блок покрытия из count слитых баров, covered — их суммарная ширина.
+    Хранятся только группа, строка и x0/x1 (плюс duration/count/covered для
+    слитых блоков); y, высота и RecordID выводятся из группы и строки для
+    запрошенных индексов.
+    """
+
+    def __init__(self, layout, shift, band, row, x0, x1, duration=None, count=None, covered=None):
+        self.layout = layout
+        self.shift = shift
+        self.band, self.row = band, row
+        self.x0, self.x1 = x0, x1
+        self.duration, self.count, self.covered = duration, count, covered
+
+    def __len__(self):
+        return len(self.x0)
+
+    def visible(self, x_min, x_max, first_band, last_band):
+        """Индексы баров групп [first_band, last_band), пересекающих [x_min, x_max]."""
+        lo, hi = np.searchsorted(self.band, [first_band, last_band])
+        mask = (self.x1[lo:hi] >= x_min) & (self.x0[lo:hi] <= x_max)
+        return lo + np.flatnonzero(mask)
+
+    def geometry(self, indices):
+        """(y0, height) баров indices в мировых координатах."""
+        layout = self.layout
+        band, row = self.band[indices], self.row[indices]
+        if not self.shift:
+            return (layout.lane_y(band) + row * layout.row_pitch,
+                    np.full(len(band), float(SUB_BAR_HEIGHT)))
+        lanes_in_band = np.minimum(1 << self.shift, len(layout.lane_names) - (band << self.shift))
+        row_height = (lanes_in_band * layout.lane_pitch - SUB_BAR_PADDING) / len(layout.records)
+        return layout.lane_y(band << self.shift) + row * row_height, row_height * SUB_BAR_HEIGHT / layout.row_pitch
+
+    def record_ids(self, indices):
+        return self.layout.record_array[self.row[indices]]
+
+    def durations(self, indices):
+        if self.duration is None:
+            return self.layout.x_to_duration(self.x1[indices] - self.x0[indices])
+        return self.duration[indices]
+
+    def counts(self, indices):
+        if self.count is None:
+            return np.ones(len(self.x0[indices]), dtype=np.int64)
+        return self.count[indices]
+
+    def coverage(self, indices):
+        """Суммарная ширина слитых баров каждого блока (у одиночного бара — его ширина)."""
+        if self.covered is None:
+            return self.x1[indices] - self.x0[indices]
+        return self.covered[indices]
+
+
+class GanttLayout:
+    """Положение всех баров диаграммы в виде столбцов NumPy.
+
+    Полоса (lane) — имя узла в порядке SeqNum первого рекорда, внутри полосы
+    каждый рекорд занимает свою строку (row). Бары отсортированы по (полоса,
+    строка, x0), поэтому бары видимых полос — непрерывный диапазон индексов,
+    который находится бинарным поиском, а отсечение по времени — одной маской.
+
+    На бар хранятся только полоса и строка (int32) и x0/x1 — 24 байта, плюс
+    8 байт накопленного максимума в IntervalIndex, который ссылается на эти
+    же массивы. RecordID, y, длительность и исходные времена выводятся из
+    них; лишь в нормированном режиме, где x0 у всех баров одинаков,
+    исходные start/end хранятся отдельно.
+    """
+
+    def __init__(self, data, normalized=False):
+        # data — NodeColumns или список строк Nodes (Name, Start, End, RecordID, SeqNum)
+        nodes = data if isinstance(data, NodeColumns) else NodeColumns.from_rows(data)
+        records = np.unique(nodes.record)
+        self.record_array = records
+        self.records = records.tolist()
+        self.normalized = normalized
+
+        # Полосы: первые вхождения имён в первом рекорде в порядке SeqNum
+        in_first = np.flatnonzero(nodes.record == records[0])
+        first_codes = nodes.name_code[in_first[np.argsort(nodes.seq[in_first], kind='stable')]]
+        _, first_seen = np.unique(first_codes, return_index=True)
+        lane_codes = first_codes[np.sort(first_seen)]
+        self.lane_names = [nodes.names[code] for code in lane_codes]
+        lane_of_code = np.full(len(nodes.names), -1, dtype=np.int32)
+        lane_of_code[lane_codes] = np.arange(len(lane_codes))
+
+        if normalized:
+            self.min_time = 0.0
+            max_duration = float((nodes.end - nodes.start).max())
+            self.total_duration = max_duration if max_duration > 0 else 1.0
+        else:
+            self.min_time, max_time = float(nodes.start.min()), float(nodes.end.max())
+            self.total_duration = max_time - self.min_time if max_time > self.min_time else 1.0
+
+        # Узлы, которых нет в первом рекорде, не получают полосы (как и раньше)
+        lane = lane_of_code[nodes.name_code]
+        keep = np.flatnonzero(lane >= 0)
+        lane = lane[keep]
+        row = np.searchsorted(records, nodes.record[keep]).astype(np.int32)
+        start, end = nodes.start[keep], nodes.end[keep]
+        if normalized:
+            x0, x1 = self.time_to_x(np.zeros_like(start)), self.time_to_x(end - start)
+        else:
+            x0, x1 = self.time_to_x(start), self.time_to_x(end)
+
+        # Группа бара — строка рекорда в полосе: lane * len(records) + row
+        group = lane.astype(np.int64) * len(records) + row
+        order = sort_by_group(group, x0)
+        self.lane, self.row = lane[order], row[order]
+        self.x0, self.x1 = x0[order], x1[order]
+        # В нормированном режиме исходные времена по x не восстановить — храним для подсказки
+        self._times = (start[order], end[order]) if normalized else None
+
+        self.row_pitch = SUB_BAR_HEIGHT + SUB_BAR_PADDING
+        self.lane_height = self.row_pitch * len(self.records)
+        self.lane_pitch = self.lane_height + SUB_BAR_PADDING
+        self.width = LEFT_MARGIN + TIMELINE_WIDTH + PADDING
+        self.graph_height = PADDING + len(self.lane_names) * self.lane_pitch
+        self.bars = BarSet(self, 0, self.lane, self.row, self.x0, self.x1)
+        self._levels = {}
+        self.index = IntervalIndex(group[order], self.x0, self.x1, presorted=True)
+
+    def __len__(self):
+        return len(self.x0)
+
+    def time_to_x(self, t):
+        return LEFT_MARGIN + (t - self.min_time) / self.total_duration * TIMELINE_WIDTH
+
+    def x_to_time(self, x):
+        return self.min_time + (x - LEFT_MARGIN) / TIMELINE_WIDTH * self.total_duration
+
+    def x_to_duration(self, width):
+        return width / TIMELINE_WIDTH * self.total_duration
+
+    def bar_times(self, index):
+        """(start, end) бара в исходном времени."""
+        if self._times is not None:
+            return self._times[0][index], self._times[1][index]
+        return self.x_to_time(self.x0[index]), self.x_to_time(self.x1[index])
+
+    def lane_y(self, lane):
+        return PADDING + lane * self.lane_pitch
+
+    def visible_lanes(self, y_min, y_max):
+        """Диапазон [first, last) полос, пересекающих мировой интервал по y."""
+        first = int(np.floor((y_min - PADDING) / self.lane_pitch))
+        last = int(np.ceil((y_max - PADDING) / self.lane_pitch))
+        return max(first, 0), min(max(last, 0), len(self.lane_names))
+
+    def visible_bands(self, y_min, y_max, shift):
+        """Диапазон групп полос (по 2**shift полос) в мировом интервале по y."""
+        first_lane, last_lane = self.visible_lanes(y_min, y_max)
+        if first_lane >= last_lane:
+            return 0, 0
+        return first_lane >> shift, ((last_lane - 1) >> shift) + 1
+
+    def band_extent(self, band, shift):
+        """(y0, y1) группы полос в мировых координатах."""
+        first_lane = band << shift
+        last_lane = min((band + 1) << shift, len(self.lane_names))
+        return self.lane_y(first_lane), self.lane_y(last_lane) - SUB_BAR_PADDING
+
+    def hit_test(self, x, y, shift=0, tolerance=0.0):
+        """Индекс бара полной детализации под мировой точкой (x, y) или None.
+
+        shift — уровень группировки полос, с которым нарисована диаграмма:
+        на грубых уровнях строка рекорда внутри группы уже и выше по экрану.
+        Полоса и строка вычисляются арифметически; на полной детализации бар
+        внутри строки ищется по IntervalIndex, на грубых — маской по барам
+        группы полос (строка группы включает строки всех её полос).
+        """
+        band = int(np.floor((y - PADDING) / (self.lane_pitch * (1 << shift))))
+        first_lane = band << shift
+        if band < 0 or first_lane >= len(self.lane_names):
+            return None
+        band_y0, band_y1 = self.band_extent(band, shift)
+        row_height = (band_y1 - band_y0) / len(self.records)
+        row = int((y - band_y0) // row_height)
+        if not 0 <= row < len(self.records) or (y - band_y0 - row * row_height) > row_height * SUB_BAR_HEIGHT / self.row_pitch:
+            return None
+        if not shift:
+            return self.index.at(x, band * len(self.records) + row, tolerance)
+        lo, hi = np.searchsorted(self.lane, [first_lane, min((band + 1) << shift, len(self.lane_names))])
+        candidates = lo + np.flatnonzero((self.row[lo:hi] == row) & (self.x0[lo:hi] <= x + tolerance)
+                                         & (self.x1[lo:hi] >= x - tolerance))
+        if not len(candidates):
+            return None
+        # Ближайший к точке бар (внутри бара расстояние нулевое)
+        distance = np.maximum(self.x0[candidates] - x, 0) + np.maximum(x - self.x1[candidates], 0)
+        return int(candidates[np.argmin(distance)])
+
+    def bars_between(self, t0, t1):
+        """Индексы баров, пересекающих интервал времени [t0, t1] (в секундах оси)."""
+        return np.sort(self.index.overlapping(float(self.time_to_x(t0)), float(self.time_to_x(t1))))
+
+    def describe(self, index):
+        """Текст подсказки по бару, как в информационной панели GanttChartApp."""
+        start, end = self.bar_times(index)
+        return (f"Layer: {self.lane_names[self.lane[index]]} | RecordID: {self.records[self.row[index]]} | "
+                f"Duration: {end - start:.4f}s "
+                f"(Original Time: {start:.3f}s - {end:.3f}s)")
+
+    def lod_key(self, scale):
+        """(shift, level) для масштаба: 2**shift полос в группе, квант слияния 2**level."""
+        level = int(np.ceil(np.log2(1.0 / scale)))
+        shift = 0
+        while self.row_pitch * scale * (1 << shift) < MIN_ROW_PX and (1 << shift) < len(self.lane_names):
+            shift += 1
+        return shift, level
+
+    def bars_for_scale(self, scale):
+        """BarSet для масштаба; уровни пирамиды строятся при первом обращении и кэшируются."""
+        key = self.lod_key(scale)
+        bars = self._levels.get(key)
+        if bars is None:
+            bars = self._merge_level(*key)
+            if len(self._levels) >= LOD_CACHE_LEVELS:
+                del self._levels[next(iter(self._levels))]
+            self._levels[key] = bars
+        return bars
+
+    def _merge_level(self, shift, level):
+        """Сливает бары уже кванта в блоки покрытия внутри каждой (группы полос, строки).
+
+        Подряд идущие узкие бары объединяются, пока зазор между ними меньше
+        кванта; широкие бары остаются отдельными, так что при приближении
+        детализация возвращается сама собой.
+        """
+        quantum = 2.0 ** level
+        band = self.lane >> shift
+        order = np.lexsort((self.x0, self.row, band)) if shift else np.arange(len(self.x0))
+        band, row = band[order], self.row[order]
+        x0, x1 = self.x0[order], self.x1[order]
+        if not len(x0):
+            return self.bars
+
+        group = band.astype(np.int64) * len(self.records) + row
+        narrow = (x1 - x0) < quantum
+        # Накопленный максимум x1 внутри группы: смещение не даёт группам смешиваться
+        offset = group * (self.width + 2 * quantum)
+        run_max = np.maximum.accumulate(x1 + offset) - offset
+        start = np.ones(len(x0), dtype=bool)
+        start[1:] = ((group[1:] != group[:-1]) | ~narrow[1:] | ~narrow[:-1]
+                     | (x0[1:] > run_max[:-1] + quantum))
+        starts = np.flatnonzero(start)
+
+        block_x1 = np.maximum.reduceat(x1, starts)
+        count = np.diff(np.append(starts, len(x0)))
+        widths = np.add.reduceat(x1 - x0, starts)
+        return BarSet(self, shift, band[starts], row[starts], x0[starts], block_x1,
+                      self.x_to_duration(widths), count, widths)
+
+    def ticks(self, x_min, x_max, max_ticks=NUM_TICKS):
+        """Деления оси времени для видимого диапазона x: (время, x, подпись).
+
+        Шаг выбирается из ряда 1-2-5 так, чтобы на экране было не больше
+        max_ticks делений; число знаков подписи зависит от шага.
+        """
+        t_min = self.min_time + (max(x_min, LEFT_MARGIN) - LEFT_MARGIN) / TIMELINE_WIDTH * self.total_duration
+        t_max = self.min_time + (min(x_max, LEFT_MARGIN + TIMELINE_WIDTH) - LEFT_MARGIN) / TIMELINE_WIDTH * self.total_duration
+        if t_max <= t_min:
+            return []
+        raw_step = (t_max - t_min) / max_ticks
+        magnitude = 10.0 ** np.floor(np.log10(raw_step))
+        step = next(m * magnitude for m in (1, 2, 5, 10) if m * magnitude >= raw_step)
+        decimals = max(0, int(-np.floor(np.log10(step))))
+        times = np.arange(np.ceil(t_min / step), np.floor(t_max / step) + 1) * step
+        return [(float(t), float(self.time_to_x(t)), f"{t:.{decimals}f}") for t in times]
+
+    def legend_y(self, index):
+        """y верхнего края элемента легенды (index = -1 — заголовок 'Legend:')."""
+        legend_y_start = self.graph_height + LEGEND_TOP_MARGIN
+        return legend_y_start + LEGEND_ITEM_HEIGHT + index * LEGEND_ITEM_HEIGHT
@@ -0,0 +1,85 @@
+import numpy as np
+
+from gantt_layout import PADDING
+
+# =====================================================================================
+#  Растровая отрисовка диаграммы Ганта: бары рисуются в буфер NumPy, а не элементами Canvas
+# =====================================================================================
+
+BACKGROUND_RGB = (0xff, 0xff, 0xff)
+LANE_STRIPE_RGB = (0xf0, 0xf0, 0xf0)
+# Полосы фона рисуются, только если полоса не тоньше этого числа пикселей
+MIN_STRIPE_PX = 2
+
+
+def hex_to_rgb(color):
+    return tuple(int(color[i:i + 2], 16) for i in (1, 3, 5))
+
+
+def _pixel_spans(lo, hi, size):
+    """Экранные интервалы [lo, hi) в целых пикселях; бар тоньше пикселя занимает один пиксель."""
+    p0 = np.floor(lo)
+    p1 = np.maximum(np.ceil(hi), p0 + 1)
+    return np.clip(p0, 0, size).astype(np.int64), np.clip(p1, 0, size).astype(np.int64)
+
+
+def paint_rects(image, x0, x1, y0, y1, rgb):
+    """Закрашивает набор прямоугольников одним цветом без цикла по прямоугольникам.
+
+    Углы прямоугольников записываются в двумерный разностный массив
+    (+1/-1, через bincount), после чего двойной cumsum даёт число
+    прямоугольников, покрывающих каждый пиксель.
+    """
+    h, w = image.shape[:2]
+    px0, px1 = _pixel_spans(x0, x1, w)
+    py0, py1 = _pixel_spans(y0, y1, h)
+    keep = (px1 > px0) & (py1 > py0)
+    if not keep.any():
+        return
+    px0, px1, py0, py1 = px0[keep], px1[keep], py0[keep], py1[keep]
+    stride, size = w + 1, (h + 1) * (w + 1)
+    diff = (np.bincount(py0 * stride + px0, minlength=size) - np.bincount(py0 * stride + px1, minlength=size)
+            - np.bincount(py1 * stride + px0, minlength=size) + np.bincount(py1 * stride + px1, minlength=size))
+    coverage = diff.reshape(h + 1, w + 1).cumsum(axis=0).cumsum(axis=1)[:h, :w]
+    image[coverage > 0] = rgb
+
+
+def rasterize(layout, scale, offset_x, offset_y, width, height, colors):
+    """Рисует видимую часть диаграммы (фон полос и бары) в RGB-буфер width x height.
+
+    colors — {RecordID: '#rrggbb'}. Используется полная детализация: бары
+    уже пикселя всё равно занимают один пиксель, а перекрытия сливаются сами.
+    """
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[:] = BACKGROUND_RGB
+    left = int(np.clip(offset_x, 0, width))
+    right = int(np.clip(layout.width * scale + offset_x, 0, width))
+
+    if layout.lane_pitch * scale >= MIN_STRIPE_PX:
+        world_y = (np.arange(height) + 0.5 - offset_y) / scale
+        lane = np.floor((world_y - PADDING) / layout.lane_pitch).astype(np.int64)
+        in_lane = (world_y - layout.lane_y(lane)) < layout.lane_height
+        stripe = in_lane & (lane >= 0) & (lane < len(layout.lane_names)) & (lane % 2 == 1)
+        image[stripe, left:right] = LANE_STRIPE_RGB
+
+    x_min, x_max = -offset_x / scale, (width - offset_x) / scale
+    y_min, y_max = -offset_y / scale, (height - offset_y) / scale
+    bars = layout.bars
+    first_lane, last_lane = layout.visible_lanes(y_min, y_max)
+    visible = bars.visible(x_min, x_max, first_lane, last_lane)
+    x0, x1 = bars.x0[visible] * scale + offset_x, bars.x1[visible] * scale + offset_x
+    y0, bar_height = bars.geometry(visible)
+    y0 = y0 * scale + offset_y
+    y1 = y0 + bar_height * scale
+    rows = bars.row[visible]
+    for row, record_id in enumerate(layout.records):
+        mask = rows == row
+        if mask.any():
+            paint_rects(image, x0[mask], x1[mask], y0[mask], y1[mask], hex_to_rgb(colors[record_id]))
+    return image
+
+
+def to_ppm(image):
+    """Двоичный PPM (P6), который tk.PhotoImage принимает напрямую."""
+    height, width = image.shape[:2]
+    return f"P6 {width} {height} 255 ".encode() + image.tobytes()
@@ -0,0 +1,111 @@
+import numpy as np
+
+from tensor_db import tensor_dtype
+
+# =====================================================================================
+#  Ленивые тензоры для TensorViewer: читают из BLOB'а только байты нужного среза
+# =====================================================================================
+
+# Тензоры больше этого размера не загружаются целиком, а читаются по срезам
+LAZY_TENSOR_BYTES = 256 * 1024 ** 2
+# Если сплошной отрезок для строки среза больше нужных байт во столько раз,
+# элементы читаются по одному вместо чтения всего отрезка
+MAX_SPAN_OVERREAD = 64
+
+
+def _normalize_key(key, shape):
+    """Приводит индекс к списку: int для зафиксированных осей, None для полных срезов."""
+    if not isinstance(key, tuple):
+        key = (key,)
+    if len(key) > len(shape):
+        raise IndexError(f"Too many indices: {len(key)} for {len(shape)} dimensions.")
+    key = key + (slice(None),) * (len(shape) - len(key))
+    normalized = []
+    for k, dim in zip(key, shape):
+        if isinstance(k, slice):
+            if k != slice(None):
+                raise TypeError("Only full slices ':' are supported for lazy tensors.")
+            normalized.append(None)
+        else:
+            k = int(k)
+            if k < 0:
+                k += dim
+            if not 0 <= k < dim:
+                raise IndexError(f"Index {k} is out of bounds for axis with size {dim}.")
+            normalized.append(k)
+    return normalized
+
+
+class BlobTensor:
+    """Тензор, хранящийся в BLOB'е, с чтением по срезам через Connection.blobopen.
+
+    Поддерживает индексацию вида t[i, :, j, :, :] (целые числа и полные срезы),
+    которой пользуется TensorViewer. Смещения считаются по Shape0..Shape4 и
+    размеру элемента, так что пиковая память не зависит от размера тензора.
+    """
+
+    def __init__(self, db, tensor_id, datatype, shape):
+        self.db = db
+        self.tensor_id = tensor_id
+        self.dtype = np.dtype(tensor_dtype(datatype))
+        self.shape = tuple(shape)
+        self.ndim = len(self.shape)
+        self.size = int(np.prod(self.shape, dtype=np.int64))
+        self.nbytes = self.size * self.dtype.itemsize
+        # Шаги по осям в элементах для C-порядка
+        strides, step = [], 1
+        for dim in reversed(self.shape):
+            strides.append(step)
+            step *= dim
+        self.strides = tuple(reversed(strides))
+
+    def _open_blob(self):
+        # В сессии из нескольких захватов BLOB читается из файла своего захвата
+        db, local_id = self.db.database_for(self.tensor_id)
+        return db.connection.blobopen(db.payload_table, 'Data', local_id, readonly=True)
+
+    def _read(self, blob, start, count):
+        itemsize = self.dtype.itemsize
+        blob.seek(start * itemsize)
+        return np.frombuffer(blob.read(count * itemsize), dtype=self.dtype)
+
+    def __getitem__(self, key):
+        index = _normalize_key(key, self.shape)
+        free_axes = [axis for axis, k in enumerate(index) if k is None]
+        base = sum(k * self.strides[axis] for axis, k in enumerate(index) if k is not None)
+        result = np.empty(tuple(self.shape[axis] for axis in free_axes), dtype=self.dtype)
+
+        with self._open_blob() as blob:
+            if not free_axes:
+                return self._read(blob, base, 1)[0]
+            # Внутренняя ось — свободная ось с наименьшим шагом (последняя в C-порядке)
+            inner_axis = free_axes[-1]
+            inner_len, inner_stride = self.shape[inner_axis], self.strides[inner_axis]
+            span = (inner_len - 1) * inner_stride + 1
+            outer_axes = free_axes[:-1]
+            flat_result = result.reshape(-1, inner_len)
+            for row, outer_index in enumerate(np.ndindex(*(self.shape[a] for a in outer_axes))):
+                start = base + sum(i * self.strides[a] for i, a in zip(outer_index, outer_axes))
+                if span <= inner_len * MAX_SPAN_OVERREAD:
+                    flat_result[row] = self._read(blob, start, span)[::inner_stride]
+                else:
+                    for col in range(inner_len):
+                        flat_result[row, col] = self._read(blob, start + col * inner_stride, 1)[0]
+        return result
+
+
+class DiffTensor:
+    """Ленивый |tensor1 - tensor2|: разность считается только для запрошенного среза."""
+
+    def __init__(self, tensor1, tensor2):
+        if tuple(tensor1.shape) != tuple(tensor2.shape):
+            raise ValueError(f"Shape mismatch: {tensor1.shape} vs {tensor2.shape}")
+        self.tensor1, self.tensor2 = tensor1, tensor2
+        self.shape = tuple(tensor1.shape)
+        self.ndim = len(self.shape)
+        self.dtype = np.result_type(tensor1.dtype, tensor2.dtype)
+        self.size = int(np.prod(self.shape, dtype=np.int64))
+        self.nbytes = self.size * self.dtype.itemsize
+
+    def __getitem__(self, key):
+        return np.abs(np.asarray(self.tensor1[key]) - np.asarray(self.tensor2[key]))
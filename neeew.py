@@ -1,3 +1,5 @@
+from tensor_db import get_database
+
 # =====================================================================================
 #  Вкладка для анализа тензоров с древовидным выбором
 # =====================================================================================
@@ -7,6 +9,7 @@ class TensorTab(ttk.Frame):
         self.pack(fill="both", expand=True)
 
         self.tensor_map = {}
+        self.db = get_database('debug.db')
 
         main_frame = ttk.Frame(self, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -57,20 +60,7 @@ class TensorTab(ttk.Frame):
 
     def _load_tensors_metadata(self):
         try:
-            conn = sqlite3.connect('debug.db')
-            cursor = conn.cursor()
-            query = """
-                SELECT T.Name, N.RecordID, T.ID as TensorID, T.Datatype, T.NumDims,
-                       T.Shape0, T.Shape1, T.Shape2, T.Shape3, T.Shape4
-                FROM Tensors T
-                JOIN TensorMap TM ON T.ID = TM.TensorID
-                JOIN Nodes N ON TM.NodeID = N.id
-                WHERE T.Name IS NOT NULL AND T.Name != ''
-                ORDER BY T.Name, N.RecordID
-            """
-            cursor.execute(query)
-            tensor_metadata = cursor.fetchall()
-            conn.close()
+            tensor_metadata = self.db.fetch_tensor_metadata()
         except sqlite3.OperationalError as e:
             messagebox.showerror("Database Error", f"Could not read tensor metadata from 'debug.db'.\nError: {e}")
             return
@@ -169,12 +159,7 @@ class TensorTab(ttk.Frame):
 
     def _fetch_blob_by_id(self, tensor_id):
         try:
-            conn = sqlite3.connect('debug.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT Data FROM Tensors WHERE ID = ?", (tensor_id,))
-            result = cursor.fetchone()
-            conn.close()
-            return result[0] if result else None
+            return self.db.fetch_blob(tensor_id)
         except sqlite3.OperationalError as e:
             messagebox.showerror("Database Error", f"Failed to fetch BLOB for TensorID {tensor_id}.\nError: {e}")
             return None
@@ -3,6 +3,9 @@ from tkinter import ttk, messagebox, filedialog
 import sqlite3
 from collections import defaultdict
 
+from capture_session import CaptureSession
+from gantt_layout import GanttLayout
+
 class GanttChartApp:
     def __init__(self, root):
         self.root = root
@@ -10,8 +13,12 @@ class GanttChartApp:
         self.root.minsize(900, 600)
 
         # --- Данные для отрисовки и состояния ---
+        # Основная БД и добавленные к ней через ATTACH (см. CaptureSession)
+        self.session = None
         self.all_data = []  # Хранит данные из ВСЕХ загруженных БД
-        self.task_info = {} # Хранит информацию о задачах для правого клика
+        # Разметка баров в массивах и преобразование холста после зума — для правого клика
+        self.layout = None
+        self.view_scale, self.view_x, self.view_y = 1.0, 0.0, 0.0
         self.record_colors = {}
         self.color_palette = [
             '#4e79a7', '#f28e2b', '#e15759', '#76b7b2', '#59a14f',
@@ -65,7 +72,7 @@ class GanttChartApp:
         self.update_chart() # Первоначальная загрузка
 
     def _add_database(self):
-        """Открывает диалог выбора файла и добавляет данные из новой БД."""
+        """Открывает диалог выбора файла и подключает новую БД к сессии."""
         filepath = filedialog.askopenfilename(
             title="Select a database file",
             filetypes=(("Database files", "*.db"), ("All files", "*.*"))
@@ -73,35 +80,14 @@ class GanttChartApp:
         if not filepath:
             return # Пользователь отменил выбор
 
-        new_data = self.fetch_data_from_db(filepath)
-        if not new_data:
-            return # Ошибка чтения или пустой файл
+        # RecordID новой БД сдвигаются сессией прямо в запросе, строки не копируются
+        try:
+            self.session.attach(filepath)
+        except (sqlite3.Error, OSError, ValueError) as e:
+            messagebox.showerror("Database Error", f"Could not add '{filepath}'.\nError: {e}")
+            return
 
-        # --- Алгоритм переназначения RecordID ---
-        if not self.all_data:
-            # Если это первая загружаемая БД
-            self.all_data = new_data
-        else:
-            # Находим максимальный существующий ID
-            max_existing_id = max(row[3] for row in self.all_data)
-            offset = max_existing_id + 1
-            
-            # Создаем карту для переназначения ID из нового файла
-            id_map = {}
-            print(new_data)
-            remapped_data = []
-            for row in new_data:
-                original_id = row[3]
-                if original_id not in id_map:
-                    # Назначаем новый уникальный ID
-                    id_map[original_id] = len(id_map) + offset
-                
-                new_id = id_map[original_id]
-                # Создаем новую строку с переназначенным ID
-                remapped_data.append((row[0], row[1], row[2], new_id, row[4]))
-            
-            self.all_data.extend(remapped_data)
-        
+        self.all_data = self.fetch_data_from_db() or []
         self._redraw_chart()
 
     def _redraw_chart(self):
@@ -109,6 +95,7 @@ class GanttChartApp:
         if self.all_data:
             self.draw_gantt(self.all_data)
         else:
+            self.layout = None
             self.canvas.delete("all")
             self.canvas.create_text(400, 300, text="No data to display.", font=("Arial", 16))
 
@@ -116,31 +103,27 @@ class GanttChartApp:
         """Полностью сбрасывает состояние и загружает основную БД."""
         self.font_sizes = self.DEFAULT_FONT_SIZES.copy()
         self.all_data.clear()
-        self.task_info.clear()
+        self.layout = None
         self._clear_info_label()
         
         # Загружаем только основную БД как начальное состояние
-        initial_data = self.fetch_data_from_db('debug.db')
-        if initial_data:
-            self.all_data = initial_data
+        if self.session is not None:
+            self.session.close()
+        self.session = CaptureSession('debug.db')
+        self.all_data = self.fetch_data_from_db() or []
         
         self._redraw_chart()
 
     def _handle_right_click(self, event):
-        clicked_ids = self.canvas.find_withtag("current")
-        found_task_tag = None
-        if clicked_ids:
-            tags = self.canvas.gettags(clicked_ids[0])
-            for tag in tags:
-                if tag.startswith("task_group_"):
-                    found_task_tag = tag
-                    break
-        if found_task_tag:
-            info = self.task_info.get(found_task_tag)
-            if info:
-                info_text = (f"Layer: {info['layer']} | RecordID: {info['record']} | Duration: {info['duration']:.4f}s "
-                             f"(Original Time: {info['start']:.3f}s - {info['end']:.3f}s)")
-                self.info_var.set(info_text)
+        """Ищет бар под курсором по индексу времени и выводит информацию о нём."""
+        index = None
+        if self.layout is not None:
+            # Координаты холста -> мировые: с учётом прокрутки и накопленного масштаба
+            x = (self.canvas.canvasx(event.x) - self.view_x) / self.view_scale
+            y = (self.canvas.canvasy(event.y) - self.view_y) / self.view_scale
+            index = self.layout.hit_test(x, y, tolerance=1.0 / self.view_scale)
+        if index is not None:
+            self.info_var.set(self.layout.describe(index))
         else:
             self._clear_info_label()
 
@@ -158,6 +141,10 @@ class GanttChartApp:
 
     def _zoom(self, factor, x, y):
         self.canvas.scale("all", x, y, factor, factor)
+        # canvas.scale не сообщает преобразование — повторяем его для hit-теста
+        self.view_scale *= factor
+        self.view_x = x + (self.view_x - x) * factor
+        self.view_y = y + (self.view_y - y) * factor
         for key in self.font_sizes: self.font_sizes[key] *= factor
         self._update_text_fonts()
         bbox = self.canvas.bbox("all")
@@ -175,21 +162,16 @@ class GanttChartApp:
             self.record_colors[record_id] = self.color_palette[len(self.record_colors) % len(self.color_palette)]
         return self.record_colors[record_id]
 
-    def fetch_data_from_db(self, db_path):
+    def fetch_data_from_db(self):
+        """Строки Nodes всех БД сессии с уже переназначенными RecordID."""
         try:
-            conn = sqlite3.connect(db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT Name, Start, End, RecordID, SeqNum FROM Nodes ORDER BY RecordID, SeqNum")
-            data = cursor.fetchall()
-            conn.close()
-            return data
-        except Exception as e:
-            messagebox.showerror("Database Error", f"Could not read from '{db_path}'.\nError: {e}")
+            return self.session.fetch_nodes()
+        except sqlite3.Error as e:
+            messagebox.showerror("Database Error", f"Could not read from '{self.session.path}'.\nError: {e}")
             return None
 
     def draw_gantt(self, data):
         self.canvas.delete("all")
-        self.task_info.clear()
 
         tasks_by_layer = defaultdict(list)
         all_records = set()
@@ -203,6 +185,8 @@ class GanttChartApp:
         if not ordered_layers: return
 
         mode = self.mode.get()
+        self.layout = GanttLayout(data, normalized=(mode == "Normalized"))
+        self.view_scale, self.view_x, self.view_y = 1.0, 0.0, 0.0
         if mode == "Default":
             self._draw_default_mode(data, tasks_by_layer, ordered_layers, all_records)
         elif mode == "Normalized":
@@ -247,8 +231,6 @@ class GanttChartApp:
         
         self.canvas.create_line(0, PADDING, canvas_width, PADDING, fill='lightgrey', dash=(2, 2))
 
-        task_counter = 0
-
         for i, layer_name in enumerate(ordered_layers):
             y_lane_start = PADDING + i * (LANE_HEIGHT + SUB_BAR_PADDING)
             
@@ -259,9 +241,6 @@ class GanttChartApp:
             self.canvas.create_text(LEFT_MARGIN - 10, y_lane_start + LANE_HEIGHT / 2, text=layer_name, anchor=tk.E, font=("Arial", int(self.font_sizes['layer_name'])), tags="layer_name_text")
             
             for task in tasks_by_layer[layer_name]:
-                task_counter += 1
-                group_tag = f"task_group_{task_counter}"
-
                 record_id, start, end = task['record_id'], task['start'], task['end']
                 color = self.get_record_color(record_id)
                 v_index = record_to_v_index.get(record_id, 0)
@@ -275,13 +254,12 @@ class GanttChartApp:
                 x0 = LEFT_MARGIN + (new_start - scale_min_time) / scale_total_duration * scale_width
                 x1 = LEFT_MARGIN + (new_end - scale_min_time) / scale_total_duration * scale_width
 
-                self.canvas.create_rectangle(x0, y0, x1, y0 + SUB_BAR_HEIGHT, fill=color, outline='black', width=1, tags=("task_bar", group_tag))
+                self.canvas.create_rectangle(x0, y0, x1, y0 + SUB_BAR_HEIGHT, fill=color, outline='black', width=1, tags="task_bar")
                 
                 duration = end - start
-                self.task_info[group_tag] = {'layer': layer_name, 'record': record_id, 'duration': duration, 'start': start, 'end': end}
                 
                 label_text = f"R:{record_id} ({duration:.2f}s)"
-                self.canvas.create_text((x0 + x1) / 2, y0 + SUB_BAR_HEIGHT / 2, text=label_text, fill='white', font=("Arial", int(self.font_sizes['bar_label']), "bold"), tags=("bar_label_text", group_tag))
+                self.canvas.create_text((x0 + x1) / 2, y0 + SUB_BAR_HEIGHT / 2, text=label_text, fill='white', font=("Arial", int(self.font_sizes['bar_label']), "bold"), tags="bar_label_text")
 
     def _draw_time_axis(self, min_time, total_duration, layers, num_records):
         PADDING, LEFT_MARGIN, TIMELINE_WIDTH = 60, 200, 2500
@@ -3,6 +3,9 @@ from tkinter import ttk, messagebox
 import sqlite3
 from collections import defaultdict
 
+from gantt_layout import GanttLayout
+from tensor_db import get_database
+
 class GanttChartApp:
     def __init__(self, root):
         self.root = root
@@ -21,8 +24,9 @@ class GanttChartApp:
         }
         self.font_sizes = self.DEFAULT_FONT_SIZES.copy()
         
-        # Словарь для хранения информации о задачах по уникальному тегу
-        self.task_info = {}
+        # Разметка баров в массивах и преобразование холста после зума — для hit-теста
+        self.layout = None
+        self.view_scale, self.view_x, self.view_y = 1.0, 0.0, 0.0
 
         # --- Создание виджетов ---
         self.main_frame = ttk.Frame(self.root, padding="10")
@@ -62,26 +66,15 @@ class GanttChartApp:
         self.update_chart()
 
     def _handle_right_click(self, event):
-        """Определяет, был ли клик по группе (прямоугольник+текст) и выводит информацию."""
-        clicked_ids = self.canvas.find_withtag("current")
-        found_task_tag = None
-        
-        if clicked_ids:
-            # Ищем среди тегов кликнутого объекта уникальный тег группы
-            tags = self.canvas.gettags(clicked_ids[0])
-            for tag in tags:
-                if tag.startswith("task_group_"):
-                    found_task_tag = tag
-                    break
-        
-        if found_task_tag:
-            info = self.task_info.get(found_task_tag)
-            if info:
-                info_text = (f"Layer: {info['layer']} | "
-                             f"RecordID: {info['record']} | "
-                             f"Duration: {info['duration']:.4f}s "
-                             f"(Original Time: {info['start']:.3f}s - {info['end']:.3f}s)")
-                self.info_var.set(info_text)
+        """Ищет бар под курсором по индексу времени и выводит информацию о нём."""
+        index = None
+        if self.layout is not None:
+            # Координаты холста -> мировые: с учётом прокрутки и накопленного масштаба
+            x = (self.canvas.canvasx(event.x) - self.view_x) / self.view_scale
+            y = (self.canvas.canvasy(event.y) - self.view_y) / self.view_scale
+            index = self.layout.hit_test(x, y, tolerance=1.0 / self.view_scale)
+        if index is not None:
+            self.info_var.set(self.layout.describe(index))
         else:
             self._clear_info_label()
 
@@ -99,6 +92,10 @@ class GanttChartApp:
 
     def _zoom(self, factor, x, y):
         self.canvas.scale("all", x, y, factor, factor)
+        # canvas.scale не сообщает преобразование — повторяем его для hit-теста
+        self.view_scale *= factor
+        self.view_x = x + (self.view_x - x) * factor
+        self.view_y = y + (self.view_y - y) * factor
         for key in self.font_sizes: self.font_sizes[key] *= factor
         self._update_text_fonts()
         bbox = self.canvas.bbox("all")
@@ -118,19 +115,14 @@ class GanttChartApp:
 
     def fetch_data_from_db(self):
         try:
-            conn = sqlite3.connect('debug.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT Name, Start, End, RecordID, SeqNum FROM Nodes ORDER BY RecordID, SeqNum")
-            data = cursor.fetchall()
-            conn.close()
-            return data
+            return get_database('debug.db').fetch_nodes()
         except sqlite3.OperationalError as e:
             messagebox.showerror("Database Error", f"Could not read from 'debug.db'.\nError: {e}")
             return None
 
     def update_chart(self):
         self.font_sizes = self.DEFAULT_FONT_SIZES.copy()
-        self.task_info.clear()
+        self.layout = None
         self._clear_info_label()
         
         data = self.fetch_data_from_db()
@@ -155,6 +147,8 @@ class GanttChartApp:
         if not ordered_layers: return
 
         mode = self.mode.get()
+        self.layout = GanttLayout(data, normalized=(mode == "Normalized"))
+        self.view_scale, self.view_x, self.view_y = 1.0, 0.0, 0.0
         if mode == "Default":
             self._draw_default_mode(data, tasks_by_layer, ordered_layers, all_records)
         elif mode == "Normalized":
@@ -199,8 +193,6 @@ class GanttChartApp:
         
         self.canvas.create_line(0, PADDING, canvas_width, PADDING, fill='lightgrey', dash=(2, 2))
 
-        task_counter = 0 # --- НОВОЕ: Счетчик для уникальных тегов ---
-
         for i, layer_name in enumerate(ordered_layers):
             y_lane_start = PADDING + i * (LANE_HEIGHT + SUB_BAR_PADDING)
             
@@ -220,9 +212,6 @@ class GanttChartApp:
             )
             
             for task in tasks_by_layer[layer_name]:
-                task_counter += 1
-                group_tag = f"task_group_{task_counter}" # Создаем уникальный тег для группы
-
                 record_id, start, end = task['record_id'], task['start'], task['end']
                 color = self.get_record_color(record_id)
                 v_index = record_to_v_index.get(record_id, 0)
@@ -236,24 +225,13 @@ class GanttChartApp:
                 x0 = LEFT_MARGIN + (new_start - scale_min_time) / scale_total_duration * scale_width
                 x1 = LEFT_MARGIN + (new_end - scale_min_time) / scale_total_duration * scale_width
 
-                # Добавляем уникальный тег группы к прямоугольнику
-                self.canvas.create_rectangle(x0, y0, x1, y0 + SUB_BAR_HEIGHT, fill=color, outline='black', width=1, tags=("task_bar", group_tag))
+                self.canvas.create_rectangle(x0, y0, x1, y0 + SUB_BAR_HEIGHT, fill=color, outline='black', width=1, tags="task_bar")
                 
                 duration = end - start
-                # Сохраняем информацию по уникальному тегу группы
-                self.task_info[group_tag] = {
-                    'layer': layer_name,
-                    'record': record_id,
-                    'duration': duration,
-                    'start': start,
-                    'end': end
-                }
-                
                 label_text = f"R:{record_id} ({duration:.2f}s)"
-                # Добавляем уникальный тег группы к тексту
                 self.canvas.create_text(
                     (x0 + x1) / 2, y0 + SUB_BAR_HEIGHT / 2, text=label_text, fill='white',
-                    font=("Arial", int(self.font_sizes['bar_label']), "bold"), tags=("bar_label_text", group_tag)
+                    font=("Arial", int(self.font_sizes['bar_label']), "bold"), tags="bar_label_text"
                 )
 
     def _draw_time_axis(self, min_time, total_duration, layers, num_records):
@@ -1,25 +1,74 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog, filedialog
+from tkinter import font as tkfont
+import os
 import sqlite3
-from collections import defaultdict
+import time
 
 # --- НОВЫЕ ИМПОРТЫ ДЛЯ ВИЗУАЛИЗАЦИИ ---
 import numpy as np
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.figure import Figure
-from skimage.measure import block_reduce # Для max-пулингаА
+
+from tensor_db import close_all_databases, tensor_dtype
+from capture_session import CaptureSession, split_tensor_id
+from tensor_analysis import ComparisonEngine
+from tensor_catalog import TensorCatalog, pairs_from_rows
+from background_jobs import JobScheduler, JobStatusBar
+from analysis_store import AnalysisStore
+from lazy_tensor import BlobTensor, DiffTensor, LAZY_TENSOR_BYTES
+from tensor_pyramid import PoolingPyramid, PYRAMID_MIN_PIXELS, strided_preview
+from tensor_stats import compute_tensor_stats
+from gantt_layout import GanttLayout, PADDING, LEFT_MARGIN
+from gantt_raster import rasterize, to_ppm
+from db_maintenance import optimize_database, split_payloads, format_plan_report
 # =====================================================================================
 #  ФИНАЛЬНАЯ ВЕРСИЯ с обработкой 0D и 1D тензоров
 # =====================================================================================
+
+# Не чаще одного кадра за этот интервал; промежуточные положения слайдера отбрасываются
+RENDER_INTERVAL_MS = 16
+# Сколько соседних срезов вперёд по направлению движения слайдера готовить заранее
+PREFETCH_RADIUS = 2
+PREFETCH_CACHE_SIZE = 8
+
+# Режимы цветовой шкалы: все берутся из статистики, посчитанной один раз на тензор
+COLOR_MODE_GLOBAL = "Global"
+COLOR_MODE_PER_SLICE = "Per-slice"
+COLOR_MODE_ROBUST = "Robust (1-99%)"
+COLOR_MODES = (COLOR_MODE_GLOBAL, COLOR_MODE_PER_SLICE, COLOR_MODE_ROBUST)
 class TensorViewer(ttk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, jobs=None, cache=None):
         super().__init__(parent)
         self.pack(fill="both", expand=True)
 
+        # Статистика для цветовой шкалы; кэшируется рядом с тензорами (TensorCache)
+        self.cache = cache
+        self.stats = None
+        self.color_mode_var = tk.StringVar(value=COLOR_MODE_GLOBAL)
+
+        # Пирамиды пулинга для больших срезов строятся в фоне
+        self.jobs = jobs if jobs is not None else JobScheduler(self)
+        self.pyramid = None
+
+        # Планировщик кадров: хранится только последний запрошенный срез/вид
+        self._render_after_id = None
+        self._pending_slice = False
+        self._last_render_time = 0.0
+        self._active_slider = None
+        self._last_slider_values = {}
+        # Заранее подготовленные соседние срезы: ключ среза -> (срез, пирамида или None)
+        self._prefetched = {}
+
         self.tensor = None
         self.current_slice = None
         self.dim_labels = []
         self.is_reshaped = False
+
+        # Постоянные артисты: при смене среза меняются только данные изображения
+        self.image = None
+        self.colorbar = None
+        self._background = None
         
         self.slice_sliders = {}
         
@@ -61,6 +110,12 @@ class TensorViewer(ttk.Frame):
         self.y_axis_combo.bind("<<ComboboxSelected>>", self._on_axis_selection_change)
         self.x_axis_combo.bind("<<ComboboxSelected>>", self._on_axis_selection_change)
 
+        ttk.Label(axis_selection_frame, text="Color Scale:").pack(side=tk.LEFT, padx=(10, 5))
+        color_mode_combo = ttk.Combobox(axis_selection_frame, textvariable=self.color_mode_var, values=COLOR_MODES,
+                                        state='readonly', width=14)
+        color_mode_combo.pack(side=tk.LEFT)
+        color_mode_combo.bind("<<ComboboxSelected>>", self._on_color_mode_change)
+
         reset_button = ttk.Button(controls_area, text="Reset View", command=self._reset_view)
         reset_button.pack(pady=5)
 
@@ -70,6 +125,7 @@ class TensorViewer(ttk.Frame):
         self._create_sliders_placeholders()
 
         self.canvas.mpl_connect('scroll_event', self._on_zoom)
+        self.canvas.mpl_connect('draw_event', self._on_draw_event)
 
     def _format_coord(self, x, y):
         if self.current_slice is None: return ""
@@ -95,7 +151,7 @@ class TensorViewer(ttk.Frame):
             frame = ttk.Frame(self.sliders_frame)
             var = tk.IntVar(value=0)
             label = ttk.Label(frame, text=f"Dim {i}:")
-            scale = tk.Scale(frame, from_=0, to=0, orient=tk.HORIZONTAL, resolution=1, variable=var, command=self._on_slider_change)
+            scale = tk.Scale(frame, from_=0, to=0, orient=tk.HORIZONTAL, resolution=1, variable=var, command=lambda value, i=i: self._on_slider_change(i))
             value_label = ttk.Label(frame, textvariable=var, width=4)
             label.pack(side=tk.LEFT)
             scale.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
@@ -103,9 +159,14 @@ class TensorViewer(ttk.Frame):
             self.slice_sliders[i] = {'frame': frame, 'var': var, 'scale': scale, 'label': label}
             frame.pack_forget()
 
-    def set_tensor(self, tensor_data):
+    def set_tensor(self, tensor_data, stats_key=None):
+        """Показывает тензор; stats_key — ключ его статистики в кэше (None — не кэшировать)."""
         self.tensor = tensor_data
         self.is_reshaped = False
+        self.stats = None
+        self._prefetched.clear()
+        self._last_slider_values.clear()
+        self._active_slider = None
         if self.tensor is None:
             self.x_axis_combo.config(state='disabled', values=[])
             self.y_axis_combo.config(state='disabled', values=[])
@@ -138,6 +199,7 @@ class TensorViewer(ttk.Frame):
             # --- ИЗМЕНЕНИЕ 2: Активируем режим панорамирования по умолчанию ---
             if self.toolbar.mode != 'pan/zoom':
                 self.toolbar.pan()
+            self._start_stats(stats_key)
 
         self._setup_sliders()
         self._update_view()
@@ -178,11 +240,44 @@ class TensorViewer(ttk.Frame):
             self.x_axis_var.set(self._prev_x_axis)
             return
         self._prev_y_axis, self._prev_x_axis = y_val, x_val
+        self._prefetched.clear()
+        self._last_slider_values.clear()
+        self._active_slider = None
         self._setup_sliders()
         self._update_view()
 
-    def _on_slider_change(self, event=None):
-        self._update_view()
+    def _on_slider_change(self, slider_index):
+        value = self.slice_sliders[slider_index]['var'].get()
+        direction = 1 if value >= self._last_slider_values.get(slider_index, 0) else -1
+        self._last_slider_values[slider_index] = value
+        self._active_slider = (slider_index, direction)
+        self._schedule_render(slice_changed=True)
+
+    def _schedule_render(self, slice_changed=False):
+        """Откладывает отрисовку до следующего кадра; повторные запросы схлопываются."""
+        self._pending_slice = self._pending_slice or slice_changed
+        if self._render_after_id is not None: return
+        elapsed_ms = (time.perf_counter() - self._last_render_time) * 1000
+        delay = max(1, int(RENDER_INTERVAL_MS - elapsed_ms))
+        self._render_after_id = self.after(delay, self._flush_render)
+
+    def _cancel_pending_render(self):
+        if self._render_after_id is not None:
+            self.after_cancel(self._render_after_id)
+            self._render_after_id = None
+        self._pending_slice = False
+
+    def _flush_render(self):
+        self._render_after_id = None
+        self._last_render_time = time.perf_counter()
+        if self._pending_slice:
+            # Слайдеры уже хранят последние значения, так что рисуется только актуальный срез
+            self._pending_slice = False
+            self._update_slice()
+            if self._active_slider is not None:
+                self._prefetch_neighbours(*self._active_slider)
+        else:
+            self.canvas.draw_idle()
 
     def _on_zoom(self, event):
         if event.xdata is None or event.ydata is None: return
@@ -195,7 +290,7 @@ class TensorViewer(ttk.Frame):
         rel_y = (cur_ylim[1] - ydata) / (cur_ylim[1] - cur_ylim[0])
         self.ax.set_xlim([xdata - new_width * (1 - rel_x), xdata + new_width * rel_x])
         self.ax.set_ylim([ydata - new_height * (1 - rel_y), ydata + new_height * rel_y])
-        self.canvas.draw_idle()
+        self._schedule_render()
 
     def _reset_view(self):
         self._update_view()
@@ -222,8 +317,216 @@ class TensorViewer(ttk.Frame):
             self.ax.set_xlim(-0.5 - margin_x, w - 0.5 + margin_x)
         self.canvas.draw_idle()
 
+    def _current_slicer(self):
+        """Индекс текущего среза: полные срезы по осям графика, положения слайдеров по остальным.
+
+        Возвращает (slicer, оси по порядку слайдеров) или None, если оси не выбраны.
+        """
+        try:
+            y_idx = int(self.y_axis_var.get().split(' ')[-1][:-1])
+            x_idx = int(self.x_axis_var.get().split(' ')[-1][:-1])
+        except (ValueError, IndexError): return None
+        slicer = [0] * self.tensor.ndim
+        slicer[y_idx] = slice(None)
+        slicer[x_idx] = slice(None)
+        plot_axes = {y_idx, x_idx}
+        slider_axes = []
+        for dim_idx in range(self.tensor.ndim):
+            if dim_idx not in plot_axes:
+                slider_pack = self.slice_sliders[len(slider_axes)]
+                slicer[dim_idx] = slider_pack['var'].get()
+                slider_axes.append(dim_idx)
+        return slicer, slider_axes
+
+    @staticmethod
+    def _slice_key(slicer):
+        # slice не хешируется, поэтому оси графика в ключе помечаются None
+        return tuple(None if isinstance(s, slice) else s for s in slicer)
+
+    def _extract_slice(self):
+        """Возвращает текущий 2D-срез тензора по выбранным осям и положениям слайдеров."""
+        if self.is_reshaped:
+            return self.tensor
+        current = self._current_slicer()
+        if current is None: return None
+        slicer, _ = current
+        prefetched = self._prefetched.get(self._slice_key(slicer))
+        if prefetched is not None:
+            return prefetched[0]
+        return self.tensor[tuple(slicer)]
+
+    def _prefetch_neighbours(self, slider_index, direction):
+        """Готовит в фоне соседние срезы (и их пирамиды) по оси активного слайдера.
+
+        Срезы ndarray — бесплатные представления, поэтому заранее читаются
+        только ленивые тензоры (BLOB'ы и разности).
+        """
+        if self.tensor is None or self.is_reshaped or isinstance(self.tensor, np.ndarray): return
+        current = self._current_slicer()
+        if current is None: return
+        slicer, slider_axes = current
+        axis = slider_axes[slider_index]
+        position = slicer[axis]
+        # Сначала срезы по направлению движения, затем один позади
+        offsets = [direction * step for step in range(1, PREFETCH_RADIUS + 1)] + [-direction]
+        todo = []
+        for offset in offsets:
+            neighbour = list(slicer)
+            neighbour[axis] = position + offset
+            key = self._slice_key(neighbour)
+            if 0 <= neighbour[axis] < self.tensor.shape[axis] and key not in self._prefetched:
+                todo.append((key, tuple(neighbour)))
+        if not todo: return
+        tensor = self.tensor
+
+        def prefetch(job):
+            results = {}
+            for key, neighbour in todo:
+                if job.cancelled: break
+                data = np.asarray(tensor[neighbour])
+                pyramid = PoolingPyramid(data, lambda: job.cancelled) if data.size >= PYRAMID_MIN_PIXELS else None
+                results[key] = (data, pyramid)
+            return results
+
+        def on_done(results):
+            if tensor is not self.tensor: return
+            self._prefetched.update(results)
+            while len(self._prefetched) > PREFETCH_CACHE_SIZE:
+                del self._prefetched[next(iter(self._prefetched))]
+
+        self.jobs.submit('prefetch', prefetch, on_done=on_done, description="Prefetching neighbouring slices")
+
+    def _start_stats(self, stats_key):
+        """Берёт статистику тензора из кэша или считает её в фоне (один проход по тензору)."""
+        if stats_key is not None and self.cache is not None:
+            self.stats = self.cache.get(stats_key)
+        if self.stats is not None:
+            self.jobs.cancel('stats')
+            return
+        tensor = self.tensor
+
+        def on_done(stats):
+            if stats is None or tensor is not self.tensor: return
+            if stats_key is not None and self.cache is not None:
+                self.cache.put(stats_key, stats)
+            self.stats = stats
+            self._apply_color_limits()
+
+        self.jobs.submit('stats', lambda job: compute_tensor_stats(tensor, lambda: job.cancelled),
+                         on_done=on_done,
+                         on_error=lambda e: messagebox.showerror("Render Error", f"Could not compute tensor statistics.\nError: {e}"),
+                         description="Computing tensor statistics")
+
+    def _color_limits(self):
+        """Пределы цветовой шкалы из статистики тензора: без редукций по срезу на каждом кадре."""
+        if self.stats is None:
+            # Статистика ещё считается: держим шкалу первого показанного среза
+            if self.image is not None:
+                return tuple(self.image.get_clim())
+            vmin, vmax = float(np.min(self.current_slice)), float(np.max(self.current_slice))
+        else:
+            mode = self.color_mode_var.get()
+            if mode == COLOR_MODE_ROBUST:
+                vmin, vmax = self.stats.percentiles
+            elif mode == COLOR_MODE_PER_SLICE and not self.is_reshaped:
+                slicer, _ = self._current_slicer()
+                vmin, vmax = self.stats.slice_limits(
+                    {axis: index for axis, index in enumerate(slicer) if not isinstance(index, slice)})
+            else:
+                vmin, vmax = self.stats.global_min, self.stats.global_max
+        if not vmax > vmin: vmax = vmin + 1.0
+        return vmin, vmax
+
+    def _apply_color_limits(self):
+        if self.image is None: return
+        self.image.set_clim(*self._color_limits())
+        self.canvas.draw_idle()
+
+    def _on_color_mode_change(self, event=None):
+        self._apply_color_limits()
+
+    def _start_pyramid(self):
+        """Для большого среза запускает построение пирамиды пулинга в фоне."""
+        self.pyramid = None
+        if self.current_slice.size < PYRAMID_MIN_PIXELS:
+            self.jobs.cancel('pyramid')
+            return
+        if not self.is_reshaped:
+            current = self._current_slicer()
+            prefetched = self._prefetched.get(self._slice_key(current[0])) if current else None
+            if prefetched is not None and prefetched[1] is not None:
+                self.jobs.cancel('pyramid')
+                self.pyramid = prefetched[1]
+                return
+        source = self.current_slice
+
+        def on_done(pyramid):
+            # Пока пирамида строилась, срез мог смениться
+            if source is self.current_slice:
+                self.pyramid = pyramid
+                self.canvas.draw_idle()
+
+        self.jobs.submit('pyramid', lambda job: PoolingPyramid(source, lambda: job.cancelled),
+                         on_done=on_done,
+                         on_error=lambda e: messagebox.showerror("Render Error", f"Could not build pooling pyramid.\nError: {e}"),
+                         description="Building pooling pyramid")
+
+    def _sync_image_to_view(self):
+        """Подставляет в изображение данные под текущий вид: уровень пирамиды и видимое окно."""
+        h, w = self.current_slice.shape
+        if self.pyramid is not None:
+            xlim, ylim = self.ax.get_xlim(), self.ax.get_ylim()
+            bbox = self.ax.bbox
+            data_per_pixel = max(abs(xlim[1] - xlim[0]) / bbox.width if bbox.width > 0 else 1.0,
+                                 abs(ylim[1] - ylim[0]) / bbox.height if bbox.height > 0 else 1.0)
+            data, extent = self.pyramid.window(self.pyramid.level_for(data_per_pixel), xlim, ylim)
+        elif self.current_slice.size >= PYRAMID_MIN_PIXELS:
+            data, extent = strided_preview(self.current_slice)
+        else:
+            data, extent = self.current_slice, (-0.5, w - 0.5, h - 0.5, -0.5)
+        self.image.set_data(data)
+        self.image.set_extent(extent)
+
+    def _on_draw_event(self, event):
+        """После каждой полной перерисовки запоминает фон осей и рисует поверх изображение.
+
+        Перерисовка бывает и при панорамировании/зуме, поэтому здесь же
+        выбирается уровень пирамиды и окно под новые пределы осей.
+        """
+        if self.image is None: return
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._sync_image_to_view()
+        self.ax.draw_artist(self.image)
+
+    def _update_slice(self):
+        """Быстрый путь для слайдеров: set_data/set_clim и blit только изображения."""
+        if self.tensor is None or self.image is None or self.is_reshaped:
+            self._update_view()
+            return
+        new_slice = self._extract_slice()
+        if new_slice is None: return
+        if new_slice.shape != self.current_slice.shape:
+            self._update_view()
+            return
+        self.current_slice = new_slice
+        self._start_pyramid()
+        vmin, vmax = self._color_limits()
+        if (vmin, vmax) != tuple(self.image.get_clim()) or self._background is None:
+            # Изменилась шкала: колорбар надо перерисовать, это одна полная перерисовка
+            self.image.set_clim(vmin, vmax)
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self._background)
+        self._sync_image_to_view()
+        self.ax.draw_artist(self.image)
+        self.canvas.blit(self.ax.bbox)
+
     def _update_view(self):
+        """Полная перестройка графика: новый тензор, смена осей или сброс вида."""
+        self._cancel_pending_render()
         self.ax.clear()
+        self.image = None
+        self._background = None
         if self.tensor is None:
             self.ax.set_aspect('auto')
             self.ax.set_xlim(0, 1); self.ax.set_ylim(0, 1)
@@ -231,32 +534,21 @@ class TensorViewer(ttk.Frame):
             self.ax.set_xticks([]); self.ax.set_yticks([])
             self.canvas.draw()
             return
-        if self.is_reshaped:
-            self.current_slice = self.tensor
-        else:
-            try:
-                y_idx = int(self.y_axis_var.get().split(' ')[-1][:-1])
-                x_idx = int(self.x_axis_var.get().split(' ')[-1][:-1])
-            except (ValueError, IndexError): return
-            slicer = [0] * self.tensor.ndim
-            slicer[y_idx] = slice(None)
-            slicer[x_idx] = slice(None)
-            plot_axes = {y_idx, x_idx}
-            visible_slider_count = 0
-            for dim_idx in range(self.tensor.ndim):
-                if dim_idx not in plot_axes:
-                    slider_pack = self.slice_sliders[visible_slider_count]
-                    slicer[dim_idx] = slider_pack['var'].get()
-                    visible_slider_count += 1
-            self.current_slice = self.tensor[tuple(slicer)]
-        vmin = 0
-        vmax = np.max(self.current_slice)
-        if vmax == 0: vmax = 1.0
-        im = self.ax.imshow(self.current_slice, cmap='viridis', interpolation='nearest', vmin=vmin, vmax=vmax)
-        if not hasattr(self, 'colorbar') or self.colorbar.ax is None or self.colorbar.ax.figure != self.fig:
-             self.colorbar = self.fig.colorbar(im, ax=self.ax)
+        current_slice = self._extract_slice()
+        if current_slice is None: return
+        self.current_slice = current_slice
+        self._start_pyramid()
+        vmin, vmax = self._color_limits()
+        # animated=True: изображение не рисуется при полной перерисовке, его
+        # добавляет _on_draw_event, а слайдеры обновляют только его через blit
+        self.image = self.ax.imshow(self.current_slice, cmap='viridis', interpolation='nearest',
+                                    vmin=vmin, vmax=vmax, animated=True)
+        # Пределы задаёт _center_and_set_view; set_extent окна пирамиды не должен их двигать
+        self.ax.set_autoscale_on(False)
+        if self.colorbar is None:
+            self.colorbar = self.fig.colorbar(self.image, ax=self.ax)
         else:
-            self.colorbar.update_normal(im)
+            self.colorbar.update_normal(self.image)
         if self.is_reshaped:
             self.ax.set_title("Tensor Value")
             self.ax.set_xlabel("")
@@ -275,7 +567,6 @@ class TensorViewer(ttk.Frame):
 import tkinter as tk
 from tkinter import ttk, messagebox
 import sqlite3
-from collections import defaultdict
 import numpy as np
 
 # Предполагается, что класс TensorViewer определен в вашем файле
@@ -292,20 +583,29 @@ import numpy as np
 #  ФИНАЛЬНАЯ ВЕРСИЯ: TensorTab с правильным меню выбора рекордов
 # =====================================================================================
 class TensorTab(ttk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, db):
         super().__init__(parent)
         self.pack(fill="both", expand=True)
 
+        self.db = db
+        self.comparison_engine = ComparisonEngine(db)
+        self.jobs = JobScheduler(self)
+
         # --- Состояние класса ---
-        self.tensor_map = {}
+        self.tensor_map = TensorCatalog()
         self.mse_results = {}
         
         # Храним только простые имена рекордов (e.g., {'rec1', 'rec2'})
         self.available_records = set()
+        # Номер захвата сессии, из которого пришёл рекорд
+        self.record_captures = {}
         self.record1_for_analysis = None
         self.record2_for_analysis = None
 
         # --- UI: Основная разметка ---
+        self.status_bar = JobStatusBar(self, self.jobs)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=(0, 10))
+
         main_paned_window = ttk.PanedWindow(self, orient=tk.HORIZONTAL)
         main_paned_window.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
@@ -351,9 +651,9 @@ class TensorTab(ttk.Frame):
         self.second_tensor_combo.bind("<<ComboboxSelected>>", self._on_second_tensor_select)
 
         # --- UI: Правая панель ---
-        result_frame = ttk.LabelFrame(right_pane, text="Resulting Difference Tensor", padding="10")
-        result_frame.pack(fill=tk.BOTH, expand=True)
-        self.tensor_viewer = TensorViewer(result_frame)
+        self.result_frame = ttk.LabelFrame(right_pane, text="Resulting Difference Tensor", padding="10")
+        self.result_frame.pack(fill=tk.BOTH, expand=True)
+        self.tensor_viewer = TensorViewer(self.result_frame, jobs=self.jobs, cache=self.db.tensor_cache)
 
     # --- Логика анализа по правому клику ---
 
@@ -378,11 +678,19 @@ class TensorTab(ttk.Frame):
             else:
                 for rec_name in other_records:
                     self.context_menu.add_command(
-                        label=f"Compare with: {rec_name}",
+                        label=f"Compare with: {self._record_label(rec_name)}",
                         command=lambda r=rec_name: self._set_comparison_record(r)
                     )
             self.context_menu.post(event.x_root, event.y_root)
 
+    def _record_label(self, record_name):
+        """Имя рекорда; если в сессии несколько захватов — с именем файла захвата."""
+        captures = getattr(self.db, 'captures', [self.db])
+        if len(captures) < 2:
+            return record_name
+        capture = captures[self.record_captures.get(record_name, 0)]
+        return f"{record_name} ({os.path.basename(capture.path)})"
+
     def _set_comparison_record(self, record_name):
         """Запоминает второе простое имя рекорда, выбранное из меню."""
         self.record2_for_analysis = record_name
@@ -391,15 +699,16 @@ class TensorTab(ttk.Frame):
     def _update_analysis_status_label(self):
         """Обновляет информационную метку о выбранных для анализа рекордах."""
         if self.record1_for_analysis and self.record2_for_analysis:
-            text = f"Analysis target:\n- {self.record1_for_analysis}\n- {self.record2_for_analysis}"
+            text = (f"Analysis target:\n- {self._record_label(self.record1_for_analysis)}"
+                    f"\n- {self._record_label(self.record2_for_analysis)}")
         elif self.record1_for_analysis:
-            text = f"Selected: {self.record1_for_analysis}.\nNow choose a comparison record."
+            text = f"Selected: {self._record_label(self.record1_for_analysis)}.\nNow choose a comparison record."
         else:
             text = "Right-click on a record (e.g., 'rec1') to select for analysis."
         self.analysis_status_label.config(text=text)
 
     def _perform_record_analysis(self):
-        """Выполняет анализ, используя простые имена рекордов для поиска и замены."""
+        """Сравнивает тензоры двух рекордов, сопоставляя их по имени, форме и типу данных."""
         if not self.record1_for_analysis or not self.record2_for_analysis:
             messagebox.showwarning("Selection Missing", "Please select two records for analysis using the right-click context menu.")
             return
@@ -408,27 +717,51 @@ class TensorTab(ttk.Frame):
         rec1_str = self.record1_for_analysis
         rec2_str = self.record2_for_analysis
         
-        compared_pairs = 0
-        for name1, info1 in self.tensor_map.items():
-            # Ищем точное вхождение, окруженное точками, чтобы избежать ложных срабатываний
-            # (например, чтобы не сработать на 'rec10' при поиске 'rec1')
-            search_str = f".{rec1_str}."
-            if search_str in name1:
-                name2 = name1.replace(search_str, f".{rec2_str}.")
-                
-                if name2 in self.tensor_map:
-                    compared_pairs += 1
-                    info2 = self.tensor_map[name2]
-                    if info1['shape'] == info2['shape']:
-                        tensor1, tensor2 = self._get_tensor_as_numpy(name1), self._get_tensor_as_numpy(name2)
-                        if tensor1 is not None and tensor2 is not None:
-                            mse = np.mean((tensor1 - tensor2) ** 2)
-                            if mse > 1e-9: # Порог для игнорирования ошибок машинного округления
-                                self.mse_results[name1] = mse
-                                self.mse_results[name2] = mse
-        
-        self._update_tree_colors()
-        messagebox.showinfo("Analysis Complete", f"Compared {compared_pairs} tensor pairs. Found {len(self.mse_results)//2} pairs with differences.")
+        record1_id, record2_id = int(rec1_str[3:]), int(rec2_str[3:])
+
+        def run_analysis(job):
+            # Выполняется в рабочем потоке: только чтение БД и NumPy, без обращений к Tk
+            # Пары подбирает SQLite одним самосоединением по индексу (имя, форма);
+            # рекорды могут быть из разных захватов сессии (например, двух сборок)
+            pairs_to_compare = pairs_from_rows(self.db.fetch_tensor_pairs(record1_id, record2_id),
+                                               record1_id, record2_id)
+            mse_results, processed_pairs = {}, 0
+            job.report_progress(0, len(pairs_to_compare))
+            store = self._open_analysis_store()
+            try:
+                for batch in self.comparison_engine.iter_batches(pairs_to_compare, is_cancelled=lambda: job.cancelled, store=store):
+                    for name1, name2, mse, max_abs_diff in batch:
+                        if mse > 1e-9: # Порог для игнорирования ошибок машинного округления
+                            mse_results[name1] = mse
+                            mse_results[name2] = mse
+                    processed_pairs += len(batch)
+                    job.report_progress(processed_pairs, len(pairs_to_compare))
+            finally:
+                if store is not None:
+                    store.close()
+            return mse_results, len(pairs_to_compare)
+
+        def on_done(result):
+            self.mse_results, compared_pairs = result
+            self._update_tree_colors()
+            messagebox.showinfo("Analysis Complete", f"Compared {compared_pairs} tensor pairs. Found {len(self.mse_results)//2} pairs with differences.")
+
+        self.jobs.submit('analysis', run_analysis, on_done=on_done,
+                         on_error=lambda e: self._show_job_error("Failed to analyze records.", e),
+                         description="Analyzing tensor pairs")
+
+    def _open_analysis_store(self):
+        """Sidecar с сохранёнными результатами; без него анализ просто считает всё заново."""
+        try:
+            return AnalysisStore.for_capture(self.db.path)
+        except sqlite3.OperationalError:
+            return None
+
+    def _show_job_error(self, message, error):
+        if isinstance(error, sqlite3.OperationalError):
+            messagebox.showerror("Database Error", f"{message}\nError: {error}")
+        else:
+            messagebox.showerror("Tensor Conversion Error", f"{message}\nError: {error}")
 
     # --- Логика раскраски дерева ---
 
@@ -483,55 +816,36 @@ class TensorTab(ttk.Frame):
     # --- Загрузка данных и ручное сравнение ---
 
     def _load_tensors_metadata(self):
-        """Загружает метаданные и отдельно собирает уникальные имена рекордов."""
-        try:
-            conn = sqlite3.connect('debug.db')
-            cursor = conn.cursor()
-            query = """
-                SELECT T.Name, N.RecordID, T.ID as TensorID, T.Datatype, T.NumDims,
-                       T.Shape0, T.Shape1, T.Shape2, T.Shape3, T.Shape4
-                FROM Tensors T
-                JOIN TensorMap TM ON T.ID = TM.TensorID
-                JOIN Nodes N ON TM.NodeID = N.id
-                WHERE T.Name IS NOT NULL AND T.Name != ''
-                ORDER BY N.RecordID, T.Name
-            """
-            cursor.execute(query)
-            tensor_metadata = cursor.fetchall()
-            conn.close()
-        except sqlite3.OperationalError as e:
-            messagebox.showerror("Database Error", f"Could not read tensor metadata.\nError: {e}")
-            return
-
-        if not tensor_metadata:
+        """Запускает фоновую загрузку метаданных; дерево строится по её завершении."""
+        self.jobs.cancel_all()
+        # Каталог с индексами строится в рабочем потоке, в UI-потоке — только дерево
+        self.jobs.submit('load', lambda job: TensorCatalog.from_metadata(self.db.fetch_tensor_metadata()),
+                         on_done=self._on_tensor_metadata_loaded,
+                         on_error=lambda e: messagebox.showerror("Database Error", f"Could not read tensor metadata.\nError: {e}"),
+                         description="Loading tensor metadata")
+
+    def _on_tensor_metadata_loaded(self, catalog):
+        """Строит дерево и отдельно собирает уникальные имена рекордов."""
+        if not catalog:
             messagebox.showinfo("No Data", "No tensors found.")
             return
 
         # Полный сброс состояния
         self.mse_results.clear()
         self.tree.delete(*self.tree.get_children())
-        self.tensor_map.clear()
+        self.tensor_map = catalog
         self.available_records.clear()
+        self.record_captures.clear()
         self.record1_for_analysis = None
         self.record2_for_analysis = None
         self._update_analysis_status_label()
 
         node_map = {}
-        for row in tensor_metadata:
-            base_name, record_id, datatype, num_dims = row[0], row[1], row[3], row[4]
-            
-            # Ваша логика формирования полного имени
-            full_name = f"dt{datatype}.rec{record_id}.{base_name}.dims{num_dims}"
-            
-            self.tensor_map[full_name] = {
-                "base_name": base_name, "record_id": record_id, "tensor_id": row[2],
-                "datatype": datatype, "dims": num_dims, 
-                "shape": tuple(s for s in row[5:10] if s > 0)
-            }
-            
+        for full_name, info in catalog.items():
             # Находим и сохраняем простое имя рекорда
-            record_name_str = f"rec{record_id}"
+            record_name_str = f"rec{info['record_id']}"
             self.available_records.add(record_name_str)
+            self.record_captures[record_name_str] = split_tensor_id(info['tensor_id'])[0]
             
             # Построение дерева
             parent_iid = ''
@@ -547,7 +861,7 @@ class TensorTab(ttk.Frame):
         self.second_tensor_combo['values'] = []
         self.second_tensor_combo.config(state="disabled")
         self.tensor_viewer.set_tensor(None)
-        messagebox.showinfo("Success", f"{len(tensor_metadata)} tensor metadata entries loaded.")
+        messagebox.showinfo("Success", f"{len(catalog)} tensor metadata entries loaded.")
 
     def _on_tree_left_click(self, event=None):
         """Обрабатывает выбор тензора (листа) для ручного сравнения."""
@@ -560,13 +874,24 @@ class TensorTab(ttk.Frame):
         selected_info = self.tensor_map.get(full_name)
         if not selected_info: return
 
-        base_name, current_shape = selected_info["base_name"], selected_info["shape"]
-        compatible_tensors = [name for name, info in self.tensor_map.items() if info["base_name"] == base_name and info["shape"] == current_shape]
-        
-        self.second_tensor_combo['values'] = compatible_tensors
+        self.second_tensor_combo['values'] = self.tensor_map.compatible(full_name)
         self.second_tensor_combo.config(state="readonly")
         self.second_tensor_combo.set('')
-        self.tensor_viewer.set_tensor(None)
+        self._display_single_tensor(full_name)
+
+    def _display_single_tensor(self, name):
+        """Показывает выбранный тензор до выбора пары (в файловой раскладке — без копирования)."""
+        def on_done(tensor):
+            self.result_frame.config(text=f"Selected Tensor: {name}")
+            self.tensor_viewer.set_tensor(tensor, stats_key=('stats', self.tensor_map[name]['tensor_id']))
+
+        def on_error(error):
+            self.tensor_viewer.set_tensor(None)
+            self._show_job_error("Failed to load tensor.", error)
+
+        # Ключ 'view' общий с расчётом разности: новый выбор отменяет предыдущую загрузку
+        self.jobs.submit('view', lambda job: self._get_tensor_for_view(name), on_done=on_done,
+                         on_error=on_error, description="Loading tensor")
 
     def _on_second_tensor_select(self, event=None):
         """Выполняет ручное сравнение при выборе из Combobox."""
@@ -587,54 +912,126 @@ class TensorTab(ttk.Frame):
             iid = self.tree.parent(iid)
         return ".".join(reversed(path_parts))
 
-    def _fetch_blob_by_id(self, tensor_id):
-        """Получает BLOB-данные тензора из БД по его ID."""
-        try:
-            conn = sqlite3.connect('debug.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT Data FROM Tensors WHERE ID = ?", (tensor_id,))
-            result = cursor.fetchone()
-            conn.close()
-            return result[0] if result else None
-        except sqlite3.OperationalError as e:
-            messagebox.showerror("Database Error", f"Failed to fetch BLOB for TensorID {tensor_id}.\nError: {e}")
-            return None
-
     def _get_tensor_as_numpy(self, name):
-        """Конвертирует BLOB-данные в тензор NumPy."""
+        """Конвертирует BLOB-данные в тензор NumPy. Может вызываться из рабочего потока.
+
+        Ошибки чтения и преобразования пробрасываются вызывающему коду.
+        """
         info = self.tensor_map.get(name)
         if not info: return None
-        blob = self._fetch_blob_by_id(info['tensor_id'])
-        if blob is None: return None
-        
-        shape = info['shape']
-        dtype = np.float32 if info['datatype'] == 0 else np.int32
         try:
-            return np.frombuffer(blob, dtype=dtype).reshape(shape)
-        except Exception as e:
-            messagebox.showerror("Tensor Conversion Error", f"Failed to convert tensor '{name}'.\nError: {e}")
-            return None
+            return self.db.load_tensor(info['tensor_id'], info['datatype'], info['shape'])
+        except ValueError as e:
+            raise ValueError(f"Failed to convert tensor '{name}': {e}") from e
+
+    def _get_tensor_for_view(self, name):
+        """Тензор для TensorViewer: большие BLOB'ы не загружаются, а читаются по срезам."""
+        info = self.tensor_map.get(name)
+        if not info: return None
+        source_db, _ = self.db.database_for(info['tensor_id'])
+        # Размер считается по форме и типу: DataSizeBytes в части захватов хранится BLOB'ом
+        nbytes = int(np.prod(info['shape'], dtype=np.int64)) * np.dtype(tensor_dtype(info['datatype'])).itemsize
+        if len(info['shape']) >= 2 and not source_db.zero_copy_payloads and nbytes > LAZY_TENSOR_BYTES:
+            return BlobTensor(self.db, info['tensor_id'], info['datatype'], info['shape'])
+        return self._get_tensor_as_numpy(name)
 
     def _calculate_and_display_diff(self, name1, name2):
-        """Вычисляет и отображает разницу между двумя тензорами."""
-        tensor1 = self._get_tensor_as_numpy(name1)
-        tensor2 = self._get_tensor_as_numpy(name2)
-        if tensor1 is None or tensor2 is None:
-            self.tensor_viewer.set_tensor(None)
-            return
-        if tensor1.shape != tensor2.shape:
-            messagebox.showerror("Shape Mismatch", f"Tensors have incompatible shapes.\n{name1}: {tensor1.shape}\n{name2}: {tensor2.shape}")
+        """Вычисляет разницу между двумя тензорами в фоне и отображает её."""
+        def compute_diff(job):
+            tensor1 = self._get_tensor_for_view(name1)
+            tensor2 = self._get_tensor_for_view(name2)
+            if tensor1 is None or tensor2 is None or tensor1.shape != tensor2.shape:
+                return tensor1, tensor2, None
+            # Для больших тензоров разность считается лениво, по срезу на кадр. Одномерные
+            # всегда загружены целиком: TensorViewer делает им reshape(1, -1), а у DiffTensor его нет
+            lazy = (tensor1.nbytes > LAZY_TENSOR_BYTES or not isinstance(tensor1, np.ndarray)
+                    or not isinstance(tensor2, np.ndarray))
+            if tensor1.ndim >= 2 and lazy:
+                return tensor1, tensor2, DiffTensor(tensor1, tensor2)
+            # Разность тоже кэшируется: повторный выбор той же пары не пересчитывает её
+            diff_key = ('diff', self.tensor_map[name1]['tensor_id'], self.tensor_map[name2]['tensor_id'])
+            diff_tensor = self.db.tensor_cache.get(diff_key)
+            if diff_tensor is None:
+                diff_tensor = self.db.tensor_cache.put(diff_key, np.abs(tensor1 - tensor2))
+            return tensor1, tensor2, diff_tensor
+
+        def on_done(result):
+            tensor1, tensor2, diff_tensor = result
+            if diff_tensor is None and tensor1 is not None and tensor2 is not None:
+                messagebox.showerror("Shape Mismatch", f"Tensors have incompatible shapes.\n{name1}: {tensor1.shape}\n{name2}: {tensor2.shape}")
+            self.result_frame.config(text="Resulting Difference Tensor")
+            stats_key = ('stats', 'diff', self.tensor_map[name1]['tensor_id'], self.tensor_map[name2]['tensor_id'])
+            self.tensor_viewer.set_tensor(diff_tensor, stats_key=stats_key)
+
+        def on_error(error):
             self.tensor_viewer.set_tensor(None)
-            return
-        diff_tensor = np.abs(tensor1 - tensor2)
-        self.tensor_viewer.set_tensor(diff_tensor)
+            self._show_job_error("Failed to compare tensors.", error)
+
+        # Повторный выбор отменяет ещё не завершённое сравнение (ключ 'view')
+        self.jobs.submit('view', compute_diff, on_done=on_done, on_error=on_error,
+                         description="Computing difference")
 # =====================================================================================
-#  Старая вкладка с диаграммой Ганта (без изменений)
+#  Вкладка с диаграммой Ганта: виртуализированная отрисовка видимой области
 # =====================================================================================
+# Оценка ширины символа подписи бара в долях размера шрифта
+BAR_LABEL_CHAR_WIDTH = 0.6
+# Размер шрифта ограничен сверху, чтобы кэш шрифтов оставался небольшим
+MAX_FONT_SIZE = 72
+
+
+class CanvasItemPool:
+    """Переиспользуемые элементы Canvas одного вида.
+
+    На каждом кадре видимые объекты размещаются в первых N элементах пула,
+    лишние прячутся, а новые создаются только если видимых объектов стало больше.
+    """
+
+    def __init__(self, canvas, create, tag, **defaults):
+        self.canvas = canvas
+        self.create = create
+        self.tag = tag
+        self.defaults = defaults
+        self.items = []
+        # Последние применённые опции каждого элемента: неизменные не отправляются в Tk
+        self.applied = []
+        self.used = 0
+        self.shown = 0
+        self.grew = False
+
+    def begin(self):
+        self.used = 0
+        self.grew = False
+
+    def place(self, coords, **options):
+        if self.used < len(self.items):
+            item = self.items[self.used]
+            self.canvas.coords(item, *coords)
+            applied = self.applied[self.used]
+            changed = {key: value for key, value in options.items() if applied.get(key) != value}
+            if self.used >= self.shown:
+                changed['state'] = 'normal'
+            if changed:
+                self.canvas.itemconfigure(item, **changed)
+                applied.update(changed)
+        else:
+            self.items.append(self.create(*coords, tags=self.tag, **{**self.defaults, **options}))
+            self.applied.append(dict(options))
+            self.grew = True
+        self.used += 1
+
+    def finish(self):
+        for item in self.items[self.used:self.shown]:
+            self.canvas.itemconfigure(item, state='hidden')
+        self.shown = self.used
+
+
 class GanttTab(ttk.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, db):
         super().__init__(parent)
         self.pack(fill="both", expand=True)
+
+        self.db = db
+        self.jobs = JobScheduler(self)
         
         self.record_colors = {}
         self.color_palette = [
@@ -645,7 +1042,20 @@ class GanttTab(ttk.Frame):
             'layer_name': 10, 'axis_label': 8, 'bar_label': 9,
             'legend_title': 12, 'legend_item': 10
         }
-        self.font_sizes = self.DEFAULT_FONT_SIZES.copy()
+
+        # Разметка в мировых координатах и преобразование вида: экран = мир * scale + offset
+        self.layout = None
+        self.view_scale = 1.0
+        self.view_x = 0.0
+        self.view_y = 0.0
+        self._drag_origin = None
+        self._render_pending = None
+        # Шрифты по (размер, начертание): при зуме подставляется готовый объект
+        self._fonts = {}
+        # Растровый режим: последний готовый кадр и преобразование, с которым он нарисован
+        self._raster_item = None
+        self._raster_photo = None
+        self._raster_view = None
 
         self.main_frame = ttk.Frame(self, padding="10")
         self.main_frame.pack(fill=tk.BOTH, expand=True)
@@ -663,19 +1073,94 @@ class GanttTab(ttk.Frame):
         ttk.Radiobutton(mode_frame, text="Default", variable=self.mode, value="Default", command=self.update_chart).pack(side=tk.LEFT, padx=5)
         ttk.Radiobutton(mode_frame, text="Normalized (by Duration)", variable=self.mode, value="Normalized", command=self.update_chart).pack(side=tk.LEFT, padx=5)
 
+        # Raster — бары рисуются в фоне в одно изображение (для захватов с миллионами узлов)
+        self.backend = tk.StringVar(value="Canvas")
+        backend_frame = ttk.LabelFrame(top_panel, text="Renderer")
+        backend_frame.pack(side=tk.LEFT, padx=(20, 0))
+        ttk.Radiobutton(backend_frame, text="Canvas", variable=self.backend, value="Canvas", command=self._on_backend_change).pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(backend_frame, text="Raster", variable=self.backend, value="Raster", command=self._on_backend_change).pack(side=tk.LEFT, padx=5)
+
+        self.info_var = tk.StringVar()
+        info_label = ttk.Label(self.main_frame, textvariable=self.info_var, anchor='w', font=("Arial", 10))
+        info_label.pack(fill=tk.X, pady=(5, 5))
+        self._clear_info_label()
+
+        self.status_bar = JobStatusBar(self.main_frame, self.jobs)
+        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X, pady=(5, 0))
+
         self.canvas = tk.Canvas(self.main_frame, bg='white')
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self._create_pools()
 
         self.canvas.bind("<ButtonPress-1>", self.move_start)
         self.canvas.bind("<B1-Motion>", self.move_move)
         self.canvas.bind("<MouseWheel>", self._on_mousewheel)
         self.canvas.bind("<Button-4>", self._on_mousewheel)
         self.canvas.bind("<Button-5>", self._on_mousewheel)
+        self.canvas.bind("<Configure>", lambda event: self._schedule_render())
+        self.canvas.bind("<Motion>", self._on_hover)
+        self.canvas.bind("<ButtonPress-3>", self._handle_right_click)
 
         self.update_chart()
 
-    def move_start(self, event): self.canvas.scan_mark(event.x, event.y)
-    def move_move(self, event): self.canvas.scan_dragto(event.x, event.y, gain=1)
+    def _create_pools(self):
+        # Порядок пулов задаёт порядок слоёв на холсте (снизу вверх)
+        c = self.canvas
+        self.pools = {
+            'lane_bg': CanvasItemPool(c, c.create_rectangle, 'lane_bg', fill='#f0f0f0', outline=''),
+            'grid_line': CanvasItemPool(c, c.create_line, 'grid_line', fill='lightgrey', dash=(2, 2)),
+            'layer_name': CanvasItemPool(c, c.create_text, 'layer_name_text', anchor=tk.E),
+            'axis_label': CanvasItemPool(c, c.create_text, 'axis_label_text', anchor=tk.N),
+            'bar': CanvasItemPool(c, c.create_rectangle, 'bar', outline='black', width=1),
+            'bar_label': CanvasItemPool(c, c.create_text, 'bar_label_text', fill='white'),
+            'legend_box': CanvasItemPool(c, c.create_rectangle, 'legend_box', outline='black'),
+            'legend_text': CanvasItemPool(c, c.create_text, 'legend_text', anchor=tk.W),
+        }
+
+    def _clear_canvas(self):
+        self.canvas.delete("all")
+        self._create_pools()
+        self._raster_item = None
+        self._raster_photo = None
+        self._raster_view = None
+
+    def _on_backend_change(self):
+        self.jobs.cancel('raster')
+        self._clear_canvas()
+        self._schedule_render()
+
+    def _bar_at(self, event):
+        """Бар под курсором через индекс времени разметки (без поиска по элементам холста)."""
+        if self.layout is None: return None
+        s = self.view_scale
+        x, y = (event.x - self.view_x) / s, (event.y - self.view_y) / s
+        # На холсте бары рисуются с группировкой полос уровня детализации, в растре — без неё
+        shift = self.layout.bars_for_scale(s).shift if self.backend.get() == "Canvas" else 0
+        # Допуск в один пиксель: бары уже пикселя тоже должны находиться
+        return self.layout.hit_test(x, y, shift=shift, tolerance=1.0 / s)
+
+    def _on_hover(self, event):
+        index = self._bar_at(event)
+        if index is None:
+            self._clear_info_label()
+        else:
+            self.info_var.set(self.layout.describe(index))
+
+    def _handle_right_click(self, event):
+        self._on_hover(event)
+
+    def _clear_info_label(self, event=None):
+        self.info_var.set("Hover or right-click on a bar for details. Left-click and drag to pan.")
+
+    def move_start(self, event):
+        self._drag_origin = (event.x, event.y, self.view_x, self.view_y)
+
+    def move_move(self, event):
+        if self._drag_origin is None: return
+        x, y, view_x, view_y = self._drag_origin
+        self.view_x = view_x + event.x - x
+        self.view_y = view_y + event.y - y
+        self._schedule_render()
 
     def _on_mousewheel(self, event):
         factor = 0
@@ -684,18 +1169,29 @@ class GanttTab(ttk.Frame):
         if factor: self._zoom(factor, event.x, event.y)
 
     def _zoom(self, factor, x, y):
-        self.canvas.scale("all", x, y, factor, factor)
-        for key in self.font_sizes: self.font_sizes[key] *= factor
-        self._update_text_fonts()
-        bbox = self.canvas.bbox("all")
-        if bbox: self.canvas.config(scrollregion=bbox)
-
-    def _update_text_fonts(self):
-        for key, size in self.font_sizes.items():
-            for item_id in self.canvas.find_withtag(f"{key}_text"):
-                font_name = "Arial"
-                font_style = "bold" if key in ['bar_label', 'legend_title'] else ""
-                self.canvas.itemconfigure(item_id, font=(font_name, int(size), font_style))
+        # Точка под курсором остаётся на месте
+        self.view_scale *= factor
+        self.view_x = x - (x - self.view_x) * factor
+        self.view_y = y - (y - self.view_y) * factor
+        self._schedule_render()
+
+    def _schedule_render(self):
+        """Перерисовка откладывается до простоя Tk: серия событий даёт один кадр."""
+        if self._render_pending is None:
+            self._render_pending = self.after_idle(self._render)
+
+    def _font_size(self, key):
+        return min(int(self.DEFAULT_FONT_SIZES[key] * self.view_scale), MAX_FONT_SIZE)
+
+    def _font(self, key):
+        """Шрифт для текущего масштаба (из кэша по размеру) или None, если текст слишком мелкий."""
+        size = self._font_size(key)
+        if size < 1: return None
+        weight = "bold" if key in ['bar_label', 'legend_title'] else "normal"
+        font = self._fonts.get((size, weight))
+        if font is None:
+            font = self._fonts[(size, weight)] = tkfont.Font(root=self, family="Arial", size=size, weight=weight)
+        return font
 
     def get_record_color(self, record_id):
         if record_id not in self.record_colors:
@@ -703,119 +1199,159 @@ class GanttTab(ttk.Frame):
         return self.record_colors[record_id]
 
     def fetch_data_from_db(self):
-        try:
-            conn = sqlite3.connect('debug.db')
-            cursor = conn.cursor()
-            cursor.execute("SELECT Name, Start, End, RecordID, SeqNum FROM Nodes ORDER BY RecordID, SeqNum")
-            data = cursor.fetchall()
-            conn.close()
-            return data
-        except sqlite3.OperationalError as e:
-            messagebox.showerror("Database Error", f"Could not read from 'debug.db'.\nError: {e}")
-            return None
+        """Читает Nodes; вызывается в рабочем потоке планировщика задач."""
+        return self.db.fetch_node_columns()
 
     def update_chart(self):
-        self.font_sizes = self.DEFAULT_FONT_SIZES.copy()
-        data = self.fetch_data_from_db()
+        # Повторное нажатие Refresh отменяет ещё не завершённую загрузку
+        self.jobs.submit('nodes', lambda job: self.fetch_data_from_db(),
+                         on_done=self._on_nodes_loaded, on_error=self._on_nodes_error,
+                         description="Loading nodes")
+
+    def _on_nodes_loaded(self, data):
         if data:
             self.draw_gantt(data)
         else:
-            self.canvas.delete("all")
-            self.canvas.create_text(400, 300, text="No data to display.", font=("Arial", 16))
+            self._show_no_data()
+
+    def _on_nodes_error(self, error):
+        messagebox.showerror("Database Error", f"Could not read from '{self.db.path}'.\nError: {error}")
+        self._show_no_data()
+
+    def _show_no_data(self):
+        self.layout = None
+        self._clear_canvas()
+        self.canvas.create_text(400, 300, text="No data to display.", font=("Arial", 16))
 
     def draw_gantt(self, data):
-        self.canvas.delete("all")
-        tasks_by_layer = defaultdict(list)
-        all_records = set()
-        for name, start, end, record_id, seq_num in data:
-            tasks_by_layer[name].append({'start': start, 'end': end, 'record_id': record_id})
-            all_records.add(record_id)
-        first_record_id = sorted(list(all_records))[0]
-        ordered_layers = [row[0] for row in sorted([r for r in data if r[3] == first_record_id], key=lambda x: x[4])]
-        if not ordered_layers: return
-        mode = self.mode.get()
-        if mode == "Default":
-            self._draw_default_mode(data, tasks_by_layer, ordered_layers, all_records)
-        elif mode == "Normalized":
-            self._draw_normalized_mode(data, tasks_by_layer, ordered_layers, all_records)
-        bbox = self.canvas.bbox("all")
-        if bbox: self.canvas.config(scrollregion=bbox)
-
-    def _draw_default_mode(self, data, tasks_by_layer, ordered_layers, all_records):
-        min_time = min(row[1] for row in data)
-        max_time = max(row[2] for row in data)
-        total_duration = max_time - min_time if max_time > min_time else 1
-        self._draw_common_elements(tasks_by_layer, ordered_layers, all_records, min_time, total_duration)
-        self._draw_time_axis(min_time, total_duration, ordered_layers, len(all_records))
-        self._draw_legend(data, ordered_layers, len(all_records))
-
-    def _draw_normalized_mode(self, data, tasks_by_layer, ordered_layers, all_records):
-        max_task_duration = max((row[2] - row[1] for row in data), default=0)
-        total_duration = max_task_duration if max_task_duration > 0 else 1
-        self._draw_common_elements(tasks_by_layer, ordered_layers, all_records, 0, total_duration)
-        self._draw_time_axis(0, total_duration, ordered_layers, len(all_records))
-        self._draw_legend(data, ordered_layers, len(all_records))
-
-    def _draw_common_elements(self, tasks_by_layer, ordered_layers, all_records, scale_min_time, scale_total_duration):
-        sorted_records = sorted(list(all_records))
-        record_to_v_index = {rec_id: i for i, rec_id in enumerate(sorted_records)}
-        num_records = len(sorted_records)
-        PADDING, LEFT_MARGIN, TIMELINE_WIDTH = 60, 200, 2500
-        scale_width = TIMELINE_WIDTH
-        SUB_BAR_HEIGHT, SUB_BAR_PADDING = 20, 5
-        LANE_HEIGHT = (SUB_BAR_HEIGHT + SUB_BAR_PADDING) * num_records
-        canvas_width = LEFT_MARGIN + TIMELINE_WIDTH + PADDING
-        self.canvas.create_line(0, PADDING, canvas_width, PADDING, fill='lightgrey', dash=(2, 2))
-        for i, layer_name in enumerate(ordered_layers):
-            y_lane_start = PADDING + i * (LANE_HEIGHT + SUB_BAR_PADDING)
-            if i % 2 == 1:
-                self.canvas.create_rectangle(0, y_lane_start, canvas_width, y_lane_start + LANE_HEIGHT, fill='#f0f0f0', outline='')
-            self.canvas.create_line(0, y_lane_start + LANE_HEIGHT, canvas_width, y_lane_start + LANE_HEIGHT, fill='lightgrey', dash=(2, 2))
-            self.canvas.create_text(LEFT_MARGIN - 10, y_lane_start + LANE_HEIGHT / 2, text=layer_name, anchor=tk.E, font=("Arial", int(self.font_sizes['layer_name'])), tags="layer_name_text")
-            for task in tasks_by_layer[layer_name]:
-                record_id, start, end = task['record_id'], task['start'], task['end']
-                color = self.get_record_color(record_id)
-                v_index = record_to_v_index.get(record_id, 0)
-                y0 = y_lane_start + v_index * (SUB_BAR_HEIGHT + SUB_BAR_PADDING)
-                if self.mode.get() == "Normalized":
-                    new_start, new_end = 0, end - start
-                else:
-                    new_start, new_end = start, end
-                x0 = LEFT_MARGIN + (new_start - scale_min_time) / scale_total_duration * scale_width
-                x1 = LEFT_MARGIN + (new_end - scale_min_time) / scale_total_duration * scale_width
-                self.canvas.create_rectangle(x0, y0, x1, y0 + SUB_BAR_HEIGHT, fill=color, outline='black', width=1)
-                duration = end - start
-                label_text = f"R:{record_id} ({duration:.2f}s)"
-                self.canvas.create_text((x0 + x1) / 2, y0 + SUB_BAR_HEIGHT / 2, text=label_text, fill='white', font=("Arial", int(self.font_sizes['bar_label']), "bold"), tags="bar_label_text")
-
-    def _draw_time_axis(self, min_time, total_duration, layers, num_records):
-        PADDING, LEFT_MARGIN, TIMELINE_WIDTH = 60, 200, 2500
-        scale_width = TIMELINE_WIDTH
-        SUB_BAR_HEIGHT, SUB_BAR_PADDING = 20, 5
-        LANE_HEIGHT = (SUB_BAR_HEIGHT + SUB_BAR_PADDING) * num_records
-        graph_height = PADDING + len(layers) * (LANE_HEIGHT + SUB_BAR_PADDING)
-        num_ticks = 10
-        for i in range(num_ticks + 1):
-            time_val = min_time + (total_duration * i / num_ticks)
-            x_pos = LEFT_MARGIN + (time_val - min_time) / total_duration * scale_width
-            self.canvas.create_line(x_pos, PADDING, x_pos, graph_height, fill='lightgrey', dash=(2, 2))
-            self.canvas.create_text(x_pos, PADDING - 20, text=f"{time_val:.2f}", anchor=tk.N, font=("Arial", int(self.font_sizes['axis_label'])), tags="axis_label_text")
-
-    def _draw_legend(self, data, layers, num_records):
-        PADDING, LEFT_MARGIN = 60, 200
-        SUB_BAR_HEIGHT, SUB_BAR_PADDING = 20, 5
-        LANE_HEIGHT = (SUB_BAR_HEIGHT + SUB_BAR_PADDING) * num_records
-        graph_height = PADDING + len(layers) * (LANE_HEIGHT + SUB_BAR_PADDING)
-        LEGEND_TOP_MARGIN, LEGEND_ITEM_HEIGHT = 40, 25
-        legend_y_start = graph_height + LEGEND_TOP_MARGIN
-        legend_x = LEFT_MARGIN
-        self.canvas.create_text(legend_x, legend_y_start, text="Legend:", anchor=tk.W, font=("Arial", int(self.font_sizes['legend_title']), "bold"), tags="legend_title_text")
-        sorted_records = sorted(list(set(row[3] for row in data)))
-        for i, record_id in enumerate(sorted_records):
+        """Строит разметку в массивах; на холсте создаются только элементы видимой области."""
+        self._clear_canvas()
+        layout = GanttLayout(data, normalized=self.mode.get() == "Normalized")
+        if not layout.lane_names: return
+        for record_id in layout.records:
+            self.get_record_color(record_id)
+        self.layout = layout
+        self.view_scale, self.view_x, self.view_y = 1.0, 0.0, 0.0
+        self._schedule_render()
+
+    def _place_bars(self, bars, x_min, x_max, first_band, last_band):
+        """Бары видимой области элементами холста (режим Canvas)."""
+        s, ox, oy = self.view_scale, self.view_x, self.view_y
+        bar_font, bar_size = self._font('bar_label'), self._font_size('bar_label')
+        visible = bars.visible(x_min, x_max, first_band, last_band)
+        xs0, xs1 = bars.x0[visible] * s + ox, bars.x1[visible] * s + ox
+        ys0, heights = bars.geometry(visible)
+        ys0, heights = ys0 * s + oy, heights * s
+        # Плотность блока: доля его ширины, покрытая слитыми барами
+        density = bars.coverage(visible) / np.maximum(bars.x1[visible] - bars.x0[visible], 1e-12)
+        for x0, x1, y0, height, record_id, duration, count, fill in zip(
+                xs0.tolist(), xs1.tolist(), ys0.tolist(), heights.tolist(), bars.record_ids(visible).tolist(),
+                bars.durations(visible).tolist(), bars.counts(visible).tolist(), density.tolist()):
             color = self.get_record_color(record_id)
-            y = legend_y_start + LEGEND_ITEM_HEIGHT + i * LEGEND_ITEM_HEIGHT
-            self.canvas.create_rectangle(legend_x, y, legend_x + 20, y + 20, fill=color, outline='black')
-            self.canvas.create_text(legend_x + 30, y + 10, text=f"RecordID #{record_id}", anchor=tk.W, font=("Arial", int(self.font_sizes['legend_item'])), tags="legend_item_text")
+            if count > 1:
+                # Блок покрытия: без рамки, редкие блоки — полупрозрачной штриховкой
+                self.pools['bar'].place((x0, y0, x1, y0 + height), fill=color, outline='',
+                                        stipple='' if fill >= 0.5 else 'gray50')
+                continue
+            self.pools['bar'].place((x0, y0, x1, y0 + height), fill=color, outline='black', stipple='')
+            if not bar_font: continue
+            label_text = f"R:{record_id} ({duration:.2f}s)"
+            # Подпись только если она помещается в бар
+            if x1 - x0 >= len(label_text) * bar_size * BAR_LABEL_CHAR_WIDTH and height >= bar_size + 2:
+                self.pools['bar_label'].place(((x0 + x1) / 2, y0 + height / 2), text=label_text, font=bar_font)
+
+    def _request_raster(self):
+        """Перерисовывает бары в фоне; пока кадр готовится, старый сдвигается вслед за видом."""
+        view = (self.view_scale, self.view_x, self.view_y)
+        width, height = max(self.canvas.winfo_width(), 1), max(self.canvas.winfo_height(), 1)
+        self._place_raster()
+        layout = self.layout
+        colors = {record_id: self.get_record_color(record_id) for record_id in layout.records}
+
+        def on_done(ppm):
+            if layout is not self.layout: return
+            self._raster_photo = tk.PhotoImage(master=self.canvas, data=ppm, format='PPM')
+            self._raster_view = view
+            if self._raster_item is None:
+                self._raster_item = self.canvas.create_image(0, 0, anchor=tk.NW, tags='raster')
+                self.canvas.tag_lower('raster')
+            self.canvas.itemconfigure(self._raster_item, image=self._raster_photo)
+            self._place_raster()
+
+        self.jobs.submit('raster', lambda job: to_ppm(rasterize(layout, *view, width, height, colors)),
+                         on_done=on_done,
+                         on_error=lambda e: messagebox.showerror("Render Error", f"Could not rasterize chart.\nError: {e}"),
+                         description="Rasterizing chart")
+
+    def _place_raster(self):
+        if self._raster_item is None: return
+        scale, view_x, view_y = self._raster_view
+        if scale == self.view_scale:
+            self.canvas.coords(self._raster_item, self.view_x - view_x, self.view_y - view_y)
+
+    def _render(self):
+        self._render_pending = None
+        layout = self.layout
+        if layout is None: return
+        s, ox, oy = self.view_scale, self.view_x, self.view_y
+        # Видимая область в мировых координатах
+        x_min, x_max = -ox / s, (self.canvas.winfo_width() - ox) / s
+        y_min, y_max = -oy / s, (self.canvas.winfo_height() - oy) / s
+        for pool in self.pools.values():
+            pool.begin()
+
+        # Уровень детализации: при сильном отдалении полосы объединяются в группы,
+        # а бары уже пикселя — в блоки покрытия
+        bars = layout.bars_for_scale(s)
+        left, right = ox, layout.width * s + ox
+        self.pools['grid_line'].place((left, PADDING * s + oy, right, PADDING * s + oy))
+        name_font = self._font('layer_name')
+        # Имена полос — только на полном уровне и если полоса выше шрифта
+        show_names = name_font and bars.shift == 0 and layout.lane_height * s >= self._font_size('layer_name') + 2
+        first_band, last_band = layout.visible_bands(y_min, y_max, bars.shift)
+        raster = self.backend.get() == "Raster"
+        for band in range(first_band, last_band):
+            y0, y1 = (y * s + oy for y in layout.band_extent(band, bars.shift))
+            if band % 2 == 1 and not raster:
+                self.pools['lane_bg'].place((left, y0, right, y1))
+            self.pools['grid_line'].place((left, y1, right, y1))
+            if show_names:
+                self.pools['layer_name'].place(((LEFT_MARGIN - 10) * s + ox, (y0 + y1) / 2),
+                                               text=layout.lane_names[band], font=name_font)
+
+        graph_top, graph_bottom = PADDING * s + oy, layout.graph_height * s + oy
+        # Ось времени строится заново для видимого диапазона; подписи прижаты к верху холста
+        axis_font = self._font('axis_label')
+        axis_y = max((PADDING - 20) * s + oy, 2)
+        for time_val, x, label in layout.ticks(x_min, x_max):
+            x = x * s + ox
+            self.pools['grid_line'].place((x, max(graph_top, 0), x, graph_bottom))
+            if axis_font:
+                self.pools['axis_label'].place((x, axis_y), text=label, font=axis_font)
+
+        if raster:
+            self._request_raster()
+        else:
+            self._place_bars(bars, x_min, x_max, first_band, last_band)
+
+        legend_x = LEFT_MARGIN * s + ox
+        title_font, item_font = self._font('legend_title'), self._font('legend_item')
+        if title_font:
+            self.pools['legend_text'].place((legend_x, layout.legend_y(-1) * s + oy), text="Legend:", font=title_font)
+        for i, record_id in enumerate(layout.records):
+            y = layout.legend_y(i) * s + oy
+            self.pools['legend_box'].place((legend_x, y, legend_x + 20 * s, y + 20 * s),
+                                           fill=self.get_record_color(record_id))
+            if item_font:
+                self.pools['legend_text'].place((legend_x + 30 * s, y + 10 * s),
+                                                text=f"RecordID #{record_id}", font=item_font)
+
+        for pool in self.pools.values():
+            pool.finish()
+        # Новые элементы создаются поверх всех: восстанавливаем порядок слоёв
+        if any(pool.grew for pool in self.pools.values()):
+            for pool in self.pools.values():
+                self.canvas.tag_raise(pool.tag)
 
 # =====================================================================================
 #  Главный класс приложения, который управляет вкладками
@@ -826,14 +1362,108 @@ class MainApp:
         self.root.title("Gantt & Tensor Analyzer")
         self.root.geometry("1200x800")
 
+        # Одно read-only соединение на поток, общее для всех вкладок; дополнительные
+        # захваты подключаются к нему через ATTACH (Database > Add Database...)
+        self.db = CaptureSession('debug.db')
+        self.jobs = JobScheduler(root)
+
+        menubar = tk.Menu(root)
+        db_menu = tk.Menu(menubar, tearoff=0)
+        db_menu.add_command(label="Add Database...", command=self._add_database)
+        db_menu.add_separator()
+        db_menu.add_command(label="Query Statistics", command=self._show_query_stats)
+        db_menu.add_command(label="Reset Statistics", command=self.db.stats.reset)
+        db_menu.add_command(label="Optimize Database", command=self._optimize_database)
+        db_menu.add_command(label="Export with Split Payloads...", command=self._export_split_layout)
+        db_menu.add_command(label="Compute Tensor Digests", command=self._compute_digests)
+        db_menu.add_separator()
+        db_menu.add_command(label="Tensor Cache Statistics", command=self._show_cache_stats)
+        db_menu.add_command(label="Set Tensor Cache Limit...", command=self._set_cache_limit)
+        menubar.add_cascade(label="Database", menu=db_menu)
+        root.config(menu=menubar)
+        root.protocol("WM_DELETE_WINDOW", self._on_close)
+
         notebook = ttk.Notebook(root)
         notebook.pack(expand=True, fill='both', padx=10, pady=10)
 
-        gantt_frame = GanttTab(notebook)
-        tensor_frame = TensorTab(notebook)
+        self.gantt_frame = GanttTab(notebook, self.db)
+        self.tensor_frame = TensorTab(notebook, self.db)
 
-        notebook.add(gantt_frame, text='Gantt Chart')
-        notebook.add(tensor_frame, text='Tensor Analysis')
+        notebook.add(self.gantt_frame, text='Gantt Chart')
+        notebook.add(self.tensor_frame, text='Tensor Analysis')
+
+    def _add_database(self):
+        """Подключает ещё один файл захвата; обе вкладки перечитывают данные всех захватов."""
+        filepath = filedialog.askopenfilename(
+            title="Select a database file",
+            filetypes=(("Database files", "*.db"), ("All files", "*.*")))
+        if not filepath:
+            return
+        self.jobs.submit('attach', lambda job: self.db.attach(filepath),
+                         on_done=lambda index: self._on_database_added(),
+                         on_error=lambda e: messagebox.showerror("Database Error", f"Could not add '{filepath}'.\nError: {e}"),
+                         description="Adding database")
+
+    def _on_database_added(self):
+        self.gantt_frame.update_chart()
+        self.tensor_frame._load_tensors_metadata()
+
+    def _show_query_stats(self):
+        messagebox.showinfo("Query Statistics", self.db.stats.format_report())
+
+    def _optimize_database(self):
+        """Создаёт индексы под загрузчики, выполняет ANALYZE и показывает планы запросов."""
+        self.jobs.submit('optimize', lambda job: optimize_database(self.db.path),
+                         on_done=lambda report: messagebox.showinfo("Optimize Database", format_plan_report(report)),
+                         on_error=lambda e: messagebox.showerror("Database Error", f"Could not optimize '{self.db.path}'.\nError: {e}"))
+
+    def _export_split_layout(self):
+        """Сохраняет копию захвата, где BLOB'ы вынесены из Tensors в отдельную таблицу."""
+        dst_path = filedialog.asksaveasfilename(
+            title="Save split-layout capture as", defaultextension=".db",
+            filetypes=(("Database files", "*.db"), ("All files", "*.*")))
+        if not dst_path:
+            return
+        self.jobs.submit('split', lambda job: split_payloads(self.db.path, dst_path),
+                         on_done=lambda report: messagebox.showinfo("Export Complete", f"Saved '{dst_path}'.\n\n{format_plan_report(report)}"),
+                         on_error=lambda e: messagebox.showerror("Database Error", f"Could not export '{dst_path}'.\nError: {e}"))
+
+    def _compute_digests(self):
+        """Хэширует содержимое ещё не хэшированных тензоров всех захватов в sidecar.
+
+        Анализ рекордов потом пропускает пары с одинаковыми дайджестами, не читая их BLOB'ы.
+        """
+        def run(job):
+            store = AnalysisStore.for_capture(self.db.path)
+            try:
+                return self.tensor_frame.comparison_engine.update_digests(
+                    store, is_cancelled=lambda: job.cancelled, report_progress=job.report_progress)
+            finally:
+                store.close()
+
+        self.jobs.submit('digests', run,
+                         on_done=lambda count: messagebox.showinfo("Tensor Digests", f"Hashed {count} new tensors."),
+                         on_error=lambda e: messagebox.showerror("Database Error", f"Could not compute tensor digests.\nError: {e}"),
+                         description="Hashing tensors")
+
+    def _show_cache_stats(self):
+        messagebox.showinfo("Tensor Cache Statistics", self.db.tensor_cache.format_report())
+
+    def _set_cache_limit(self):
+        current_mb = self.db.tensor_cache.max_bytes // 1024 ** 2
+        limit_mb = simpledialog.askinteger("Tensor Cache Limit", "Cache limit (MB):",
+                                           initialvalue=current_mb, minvalue=0, parent=self.root)
+        if limit_mb is not None:
+            self.db.tensor_cache.set_limit(limit_mb * 1024 ** 2)
+
+    def _on_close(self):
+        self.jobs.shutdown()
+        self.gantt_frame.jobs.shutdown()
+        self.tensor_frame.jobs.shutdown()
+        self.tensor_frame.comparison_engine.shutdown()
+        self.db.close()
+        close_all_databases()
+        self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
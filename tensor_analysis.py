@@ -0,0 +1,347 @@
+import hashlib
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from tensor_db import BLOB_CHUNK_SIZE, decode_tensor
+
+# =====================================================================================
+#  Пакетное и параллельное сравнение тензоров двух рекордов
+# =====================================================================================
+
+# Сколько пар обрабатывается за один запрос WHERE ID IN (...): 2 ID на пару
+PAIR_CHUNK_SIZE = BLOB_CHUNK_SIZE // 2
+# Сколько BLOB'ов одной стороны пар читается одним запросом при потоковом сравнении
+STREAM_CHUNK_SIZE = 16
+# Размер дайджеста blake2b содержимого тензора (байт)
+DIGEST_SIZE = 16
+# Сколько байт BLOB'а читается за раз при потоковом хэшировании
+DIGEST_READ_BYTES = 1 << 20
+# Примерный объём payload'ов на одну задачу хэширования (и одну транзакцию записи дайджестов)
+DIGEST_CHUNK_BYTES = 64 * 1024 ** 2
+# Размер блока (в элементах) для слитного вычисления MSE без полноразмерных временных массивов
+MSE_BLOCK_ELEMENTS = 1 << 20
+
+
+def fused_diff_stats(tensor1, tensor2, block_elements=MSE_BLOCK_ELEMENTS):
+    """(MSE, max|diff|) двух тензоров одинаковой формы, посчитанные блоками в float64.
+
+    Разность пишется в один переиспользуемый буфер, сумма квадратов — через
+    np.dot, поэтому память на пару не зависит от размера тензора.
+    """
+    flat1, flat2 = tensor1.reshape(-1), tensor2.reshape(-1)
+    size = flat1.size
+    if size == 0:
+        return 0.0, 0.0
+    buffer = np.empty(min(size, block_elements), dtype=np.float64)
+    total, max_abs = 0.0, 0.0
+    for start in range(0, size, block_elements):
+        stop = min(start + block_elements, size)
+        diff = buffer[:stop - start]
+        # Вычитание сразу в float64: в int32 разность переполняется, в float32 теряет точность
+        np.subtract(flat1[start:stop], flat2[start:stop], out=diff, dtype=np.float64)
+        total += float(np.dot(diff, diff))
+        np.abs(diff, out=diff)
+        max_abs = max(max_abs, float(diff.max()))
+    return total / size, max_abs
+
+
+_EXHAUSTED = object()
+
+
+def tensor_digest(data):
+    """Дайджест содержимого тензора: BLOB или C-непрерывный массив с теми же байтами."""
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+
+def stream_digest(db, tensor_id, read_bytes=DIGEST_READ_BYTES):
+    """Тот же дайджест, что tensor_digest, но payload читается кусками по read_bytes.
+
+    Тензор не загружается в память целиком, так что хэшируются и тензоры
+    больше RAM. BLOB читается через blobopen, файл payload — срезами mmap.
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    if db.zero_copy_payloads:
+        view = db.fetch_blob(tensor_id)
+        for start in range(0, len(view), read_bytes):
+            digest.update(view[start:start + read_bytes])
+        return digest.digest()
+    with db.connection.blobopen(db.payload_table, 'Data', tensor_id, readonly=True) as blob:
+        while True:
+            part = blob.read(read_bytes)
+            if not part:
+                break
+            digest.update(part)
+    return digest.digest()
+
+
+def _chunk_by_bytes(keys, max_bytes=DIGEST_CHUNK_BYTES, max_count=BLOB_CHUNK_SIZE):
+    """Делит строки (TensorID, Name, Datatype, DataSizeBytes) на пачки ограниченного объёма."""
+    chunk, chunk_bytes = [], 0
+    for key in keys:
+        size = key[3] if isinstance(key[3], int) else 0
+        if chunk and (chunk_bytes + size > max_bytes or len(chunk) >= max_count):
+            yield chunk
+            chunk, chunk_bytes = [], 0
+        chunk.append(key)
+        chunk_bytes += size
+    if chunk:
+        yield chunk
+
+
+def _interleave(*iterators):
+    """Поочерёдно берёт по элементу из каждого итератора, пока все не иссякнут."""
+    active = list(iterators)
+    while active:
+        for iterator in list(active):
+            item = next(iterator, _EXHAUSTED)
+            if item is _EXHAUSTED:
+                active.remove(iterator)
+            else:
+                yield item
+
+
+def _iter_chunk_pairs(db, chunk):
+    """Отдаёт (name1, name2, tensor1, tensor2) для пачки пар по мере готовности.
+
+    Тензоры берутся из общего LRU-кэша БД. Недостающие BLOB'ы первой и второй
+    стороны пар читаются двумя потоками запросов поочерёдно: если пары
+    записаны в обоих захватах в одном порядке, пара готова сразу после чтения
+    второго тензора, и в памяти держатся только ещё не сравнённые тензоры.
+    """
+    infos = {}
+    pending = defaultdict(int)
+    for pair in chunk:
+        infos[pair[1]['tensor_id']] = pair[1]
+        infos[pair[3]['tensor_id']] = pair[3]
+
+    loaded = {}
+    for tensor_id in infos:
+        tensor = db.tensor_cache.get(tensor_id)
+        if tensor is not None:
+            loaded[tensor_id] = tensor
+
+    waiting = defaultdict(list)
+    for name1, info1, name2, info2 in chunk:
+        id1, id2 = info1['tensor_id'], info2['tensor_id']
+        if id1 in loaded and id2 in loaded:
+            yield name1, name2, loaded[id1], loaded[id2]
+            continue
+        pending[id1] += 1
+        pending[id2] += 1
+        for tensor_id in {id1, id2} - loaded.keys():
+            waiting[tensor_id].append((name1, id1, name2, id2))
+
+    if not waiting:
+        return
+    first_side = {pair[1]['tensor_id'] for pair in chunk}
+    first_ids = [tensor_id for tensor_id in waiting if tensor_id in first_side]
+    second_ids = [tensor_id for tensor_id in waiting if tensor_id not in first_side]
+    streams = [db.iter_blobs(ids, chunk_size=STREAM_CHUNK_SIZE) for ids in (first_ids, second_ids) if ids]
+    for tensor_id, blob in _interleave(*streams):
+        info = infos[tensor_id]
+        loaded[tensor_id] = db.cache_tensor(tensor_id, decode_tensor(blob, info['datatype'], info['shape']))
+        for name1, id1, name2, id2 in waiting.pop(tensor_id, ()):
+            if id1 in loaded and id2 in loaded:
+                yield name1, name2, loaded[id1], loaded[id2]
+                # Тензор больше не нужен ни одной паре пачки — отпускаем его
+                for done_id in (id1, id2):
+                    pending[done_id] -= 1
+                    if not pending[done_id]:
+                        loaded.pop(done_id, None)
+
+
+def _order_pairs(pairs):
+    # Пары упорядочиваются по TensorID, чтобы каждая пачка читала соседние страницы таблицы
+    return sorted(pairs, key=lambda p: min(p[1]['tensor_id'], p[3]['tensor_id']))
+
+
+class ComparisonEngine:
+    """Параллельный расчёт MSE по пачкам пар на пуле потоков.
+
+    pairs — список кортежей (name1, info1, name2, info2), где info — словари
+    из TensorTab.tensor_map.
+
+    Каждый рабочий поток читает BLOB'ы через своё соединение TensorDatabase
+    (соединения в ней thread-local), а NumPy и sqlite3 отпускают GIL на время
+    тяжёлой работы, так что потоки реально загружают все ядра.
+    """
+
+    def __init__(self, db, max_workers=None, chunk_size=PAIR_CHUNK_SIZE):
+        self.db = db
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        # Пул живёт вместе с движком: его потоки держат свои соединения к БД
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mse")
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _compare_chunk(self, chunk, is_cancelled, with_digests=False):
+        """(результаты пар, [(info, дайджест)] прочитанных тензоров, если with_digests)."""
+        infos = {}
+        for name1, info1, name2, info2 in chunk:
+            infos[name1], infos[name2] = info1, info2
+        results, digests = [], []
+        for name1, name2, tensor1, tensor2 in _iter_chunk_pairs(self.db, chunk):
+            if is_cancelled():
+                break
+            results.append((name1, name2, *fused_diff_stats(tensor1, tensor2)))
+            if with_digests:
+                # Тензоры уже в памяти: дайджест почти бесплатен и пригодится следующему анализу
+                digests.append((infos[name1], tensor_digest(tensor1)))
+                digests.append((infos[name2], tensor_digest(tensor2)))
+        return results, digests
+
+    def _digest_key(self, info):
+        """(source, TensorID в файле, Name, Datatype, DataSizeBytes) — ключ дайджеста в AnalysisStore."""
+        return (*self.db.tensor_source(info['tensor_id']), info['base_name'], info['datatype'], info['size_bytes'])
+
+    def _hash_chunk(self, capture, source, keys, is_cancelled):
+        rows = []
+        for tensor_id, *guard in keys:
+            if is_cancelled():
+                break
+            rows.append((source, tensor_id, *guard, stream_digest(capture, tensor_id)))
+        return rows
+
+    def update_digests(self, store, is_cancelled=lambda: False, report_progress=None):
+        """Считает дайджесты тензоров, которых ещё нет в store, и возвращает их число.
+
+        Проходит по всем захватам сессии; при повторном вызове хэшируются
+        только тензоры, дописанные в захват после прошлого раза (и те, чьи
+        Name/Datatype/DataSizeBytes не совпали с сохранёнными).
+        """
+        work = []
+        for capture in getattr(self.db, 'captures', [self.db]):
+            source = os.path.abspath(capture.path)
+            keys = capture.fetch_tensor_digest_keys()
+            store.validate_digests(source, keys[-1][0] if keys else None)
+            known = store.hashed_tensors(source)
+            keys = [key for key in keys if known.get(key[0]) != tuple(key[1:])]
+            work.extend((capture, source, chunk) for chunk in _chunk_by_bytes(keys))
+        total = sum(len(keys) for _, _, keys in work)
+        executor = self._get_executor()
+        futures = [executor.submit(self._hash_chunk, capture, source, keys, is_cancelled)
+                   for capture, source, keys in work]
+        done = 0
+        try:
+            for future in as_completed(futures):
+                if is_cancelled():
+                    break
+                rows = future.result()
+                store.save_digests(rows)
+                done += len(rows)
+                if report_progress is not None:
+                    report_progress(done, total)
+        finally:
+            for future in futures:
+                future.cancel()
+        return done
+
+    def _split_identical(self, pairs, store):
+        """Делит пары на побитово одинаковые (по сохранённым дайджестам) и остальные."""
+        keys = {id(pair): (self._digest_key(pair[1]), self._digest_key(pair[3])) for pair in pairs}
+        sources = {}
+        for pair in pairs:
+            for info in (pair[1], pair[3]):
+                db, _ = self.db.database_for(info['tensor_id'])
+                sources.setdefault(os.path.abspath(db.path), db)
+        for source, db in sources.items():
+            store.validate_digests(source, db.fetch_max_tensor_id())
+        digests = store.lookup_digests([key for both in keys.values() for key in both])
+        identical, remaining = [], []
+        for pair in pairs:
+            key1, key2 = keys[id(pair)]
+            digest1 = digests.get(key1[:2])
+            if digest1 is not None and digest1 == digests.get(key2[:2]) and key1[4] == key2[4]:
+                identical.append((pair[0], pair[2], 0.0, 0.0))
+            else:
+                remaining.append(pair)
+        return identical, remaining
+
+    def _store_key(self, info1, info2):
+        source1, id1 = self.db.tensor_source(info1['tensor_id'])
+        source2, id2 = self.db.tensor_source(info2['tensor_id'])
+        return source1, id1, info1.get('size_bytes'), source2, id2, info2.get('size_bytes')
+
+    def iter_batches(self, pairs, is_cancelled=lambda: False, store=None):
+        """Отдаёт результаты списками (name1, name2, mse, max_abs_diff) по мере завершения пачек.
+
+        is_cancelled опрашивается между парами; после отмены оставшиеся пачки
+        снимаются с очереди пула. Если передан AnalysisStore, сохранённые
+        результаты отдаются первой пачкой без чтения BLOB'ов, пары с равными
+        дайджестами содержимого — следующей (MSE и max|diff| у них нулевые),
+        а новые результаты и дайджесты прочитанных тензоров дописываются в него.
+        """
+        if store is not None:
+            keys = {id(pair): self._store_key(pair[1], pair[3]) for pair in pairs}
+            for source in {key[0] for key in keys.values()} | {key[3] for key in keys.values()}:
+                store.validate_source(source)
+            cached = store.lookup(list(keys.values()))
+            cached_batch, remaining = [], []
+            for pair in pairs:
+                key = keys[id(pair)]
+                stats = cached.get((key[0], key[1], key[3], key[4]))
+                if stats is None:
+                    remaining.append(pair)
+                else:
+                    cached_batch.append((pair[0], pair[2], *stats))
+            if cached_batch:
+                yield cached_batch
+            identical_batch, pairs = self._split_identical(remaining, store)
+            if identical_batch:
+                yield identical_batch
+
+        by_names = {(pair[0], pair[2]): pair for pair in pairs}
+        for batch, digests in self._iter_computed_batches(pairs, is_cancelled, with_digests=store is not None):
+            if store is not None:
+                rows = []
+                for name1, name2, mse, max_abs in batch:
+                    _, info1, _, info2 = by_names[(name1, name2)]
+                    rows.append((*self._store_key(info1, info2), mse, max_abs, str(info1['shape'])))
+                store.save(rows)
+                store.save_digests([(*self._digest_key(info), digest) for info, digest in digests])
+            yield batch
+
+    def _iter_computed_batches(self, pairs, is_cancelled, with_digests=False):
+        ordered = _order_pairs(pairs)
+        chunks = [ordered[i:i + self.chunk_size] for i in range(0, len(ordered), self.chunk_size)]
+        executor = self._get_executor()
+        futures = [executor.submit(self._compare_chunk, chunk, is_cancelled, with_digests) for chunk in chunks]
+        try:
+            for future in as_completed(futures):
+                if is_cancelled():
+                    break
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _check_fused_diff_stats():
+    """Сверяет fused_diff_stats с прямым расчётом в float64 на граничных int32 и float32."""
+    cases = [
+        (np.array([2**31 - 1, -2**31], dtype=np.int32), np.array([-2**31, 2**31 - 1], dtype=np.int32)),
+        (np.array([1e8, 1.0, -3.5e7], dtype=np.float32), np.array([1e8 + 8, 1.0 + 1e-7, -3.5e7 - 4], dtype=np.float32)),
+    ]
+    for tensor1, tensor2 in cases:
+        diff = tensor1.astype(np.float64) - tensor2.astype(np.float64)
+        expected = (float(np.mean(diff * diff)), float(np.abs(diff).max()))
+        for block_elements in (1, MSE_BLOCK_ELEMENTS):
+            got = fused_diff_stats(tensor1, tensor2, block_elements)
+            assert np.allclose(got, expected, rtol=1e-12), f"{tensor1.dtype}: {got} != {expected}"
+
+
+if __name__ == "__main__":
+    _check_fused_diff_stats()
+    print("fused_diff_stats: OK")
@@ -0,0 +1,86 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# =====================================================================================
+#  LRU-кэш декодированных тензоров с ограничением по объёму памяти
+# =====================================================================================
+
+DEFAULT_CACHE_BYTES = 2 * 1024 ** 3
+
+
+class TensorCache:
+    """Потокобезопасный LRU-кэш массивов NumPy, ограниченный суммарным nbytes.
+
+    Ключ — TensorID (или кортеж для производных тензоров, например разностей).
+    Массивы хранятся только для чтения, чтобы их можно было безопасно делить
+    между вкладками и рабочими потоками. Кроме массивов можно хранить любые
+    объекты с атрибутом nbytes (например, TensorStats).
+    """
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            array = self._entries.get(key)
+            if array is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return array
+
+    def put(self, key, array):
+        # Массив больше всего бюджета не кэшируем: он вытеснил бы всё остальное
+        if array is None or array.nbytes > self.max_bytes:
+            return array
+        if isinstance(array, np.ndarray) and array.flags.writeable:
+            array.flags.writeable = False
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self._entries[key] = array
+            self.current_bytes += array.nbytes
+            self._evict_locked()
+        return array
+
+    def set_limit(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict_locked()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _evict_locked(self):
+        while self.current_bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries), 'bytes': self.current_bytes, 'max_bytes': self.max_bytes,
+                'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+            }
+
+    def format_report(self):
+        stats = self.stats()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / lookups * 100 if lookups else 0.0
+        return (f"Entries: {stats['entries']}\n"
+                f"Size: {stats['bytes'] / 1024 ** 2:.1f} MB of {stats['max_bytes'] / 1024 ** 2:.0f} MB\n"
+                f"Hits: {stats['hits']}, misses: {stats['misses']} ({hit_rate:.1f}% hit rate)\n"
+                f"Evictions: {stats['evictions']}")
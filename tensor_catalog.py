@@ -0,0 +1,101 @@
+from collections import defaultdict
+
+# =====================================================================================
+#  Каталог тензоров захвата с хэш-индексом совместимых тензоров
+# =====================================================================================
+
+
+def tensor_full_name(base_name, record_id, datatype, num_dims):
+    """Полное имя тензора — путь в дереве TensorTab."""
+    return f"dt{datatype}.rec{record_id}.{base_name}.dims{num_dims}"
+
+
+def compatibility_key(info):
+    """Тензоры с одинаковым ключом можно сравнивать поэлементно."""
+    return info['base_name'], info['shape'], info['datatype']
+
+
+def _tensor_info(base_name, record_id, tensor_id, datatype, num_dims, shape, size_bytes):
+    return {
+        "base_name": base_name, "record_id": record_id, "tensor_id": tensor_id,
+        "datatype": datatype, "dims": num_dims,
+        "shape": tuple(s for s in shape if s > 0), "size_bytes": size_bytes
+    }
+
+
+def pairs_from_rows(rows, record1, record2):
+    """Пары (name1, info1, name2, info2) из строк TensorDatabase.fetch_tensor_pairs().
+
+    Каждому тензору первого рекорда достаётся одна пара — с тензором второго
+    рекорда с наименьшим TensorID (строки упорядочены по ID).
+    """
+    pairs, seen = [], set()
+    for base_name, id1, id2, datatype, num_dims1, num_dims2, *shape, size_bytes in rows:
+        name1 = tensor_full_name(base_name, record1, datatype, num_dims1)
+        if name1 in seen:
+            continue
+        seen.add(name1)
+        pairs.append((name1, _tensor_info(base_name, record1, id1, datatype, num_dims1, shape, size_bytes),
+                      tensor_full_name(base_name, record2, datatype, num_dims2),
+                      _tensor_info(base_name, record2, id2, datatype, num_dims2, shape, size_bytes)))
+    return pairs
+
+
+class TensorCatalog:
+    """Метаданные тензоров по полному имени плюс индекс совместимых тензоров.
+
+    by_key группирует имена по (base_name, shape, datatype), построенный
+    один раз при загрузке, так что поиск совместимых тензоров — одно
+    обращение к словарю. Пары двух рекордов подбирает SQLite (см.
+    pairs_from_rows). Ведёт себя как словарь {полное имя: info}, которым
+    был tensor_map.
+    """
+
+    def __init__(self):
+        self.tensors = {}
+        self.by_key = defaultdict(list)
+
+    @classmethod
+    def from_metadata(cls, rows):
+        """Каталог из строк fetch_tensor_metadata()."""
+        catalog = cls()
+        for row in rows:
+            base_name, record_id, tensor_id, datatype, num_dims = row[:5]
+            catalog.add(tensor_full_name(base_name, record_id, datatype, num_dims),
+                        _tensor_info(base_name, record_id, tensor_id, datatype, num_dims, row[5:10], row[10]))
+        return catalog
+
+    def add(self, name, info):
+        if name in self.tensors:
+            return
+        self.tensors[name] = info
+        self.by_key[compatibility_key(info)].append(name)
+
+    # --- Доступ как к словарю ---
+
+    def __len__(self):
+        return len(self.tensors)
+
+    def __contains__(self, name):
+        return name in self.tensors
+
+    def __getitem__(self, name):
+        return self.tensors[name]
+
+    def __iter__(self):
+        return iter(self.tensors)
+
+    def get(self, name, default=None):
+        return self.tensors.get(name, default)
+
+    def items(self):
+        return self.tensors.items()
+
+    # --- Запросы по индексу ---
+
+    def compatible(self, name):
+        """Имена тензоров, совместимых с name (включая его самого)."""
+        info = self.tensors.get(name)
+        if info is None:
+            return []
+        return list(self.by_key[compatibility_key(info)])
@@ -0,0 +1,393 @@
+import mmap
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from tensor_cache import DEFAULT_CACHE_BYTES, TensorCache
+
+# =====================================================================================
+#  Общий слой доступа к БД захвата: одно долгоживущее read-only соединение на поток
+# =====================================================================================
+
+DEFAULT_DB_PATH = 'debug.db'
+
+# Тексты запросов держим константами: модуль sqlite3 кэширует подготовленные
+# statement'ы по тексту SQL, поэтому повторные вызовы не перекомпилируют запрос.
+NODES_QUERY = "SELECT Name, Start, End, RecordID, SeqNum FROM Nodes ORDER BY RecordID, SeqNum"
+NODES_COUNT_QUERY = "SELECT COUNT(*) FROM Nodes"
+# Nodes читается пачками этого размера прямо в столбцы NodeColumns
+NODES_FETCH_SIZE = 65536
+TENSOR_METADATA_QUERY = """
+    SELECT T.Name, N.RecordID, T.ID as TensorID, T.Datatype, T.NumDims,
+           T.Shape0, T.Shape1, T.Shape2, T.Shape3, T.Shape4, T.DataSizeBytes
+    FROM Tensors T
+    JOIN TensorMap TM ON T.ID = TM.TensorID
+    JOIN Nodes N ON TM.NodeID = N.id
+    WHERE T.Name IS NOT NULL AND T.Name != ''
+    ORDER BY N.RecordID, T.Name
+"""
+# Пары совместимых тензоров двух рекордов одним самосоединением: одинаковые Name,
+# Datatype, форма и DataSizeBytes. {left}/{right} — схемы захватов рекордов (main для
+# одного файла); первые два параметра — сдвиги TensorID (см. capture_session).
+TENSOR_PAIRS_QUERY = """
+    SELECT T1.Name, T1.ID + ?, T2.ID + ?, T1.Datatype, T1.NumDims, T2.NumDims,
+           T1.Shape0, T1.Shape1, T1.Shape2, T1.Shape3, T1.Shape4, T1.DataSizeBytes
+    FROM {left}.Nodes N1
+    JOIN {left}.TensorMap TM1 ON TM1.NodeID = N1.id
+    JOIN {left}.Tensors T1 ON T1.ID = TM1.TensorID
+    JOIN {right}.Tensors T2 ON T2.Name = T1.Name AND T2.Datatype = T1.Datatype
+     AND T2.Shape0 IS T1.Shape0 AND T2.Shape1 IS T1.Shape1 AND T2.Shape2 IS T1.Shape2
+     AND T2.Shape3 IS T1.Shape3 AND T2.Shape4 IS T1.Shape4 AND T2.DataSizeBytes IS T1.DataSizeBytes
+    JOIN {right}.TensorMap TM2 ON TM2.TensorID = T2.ID
+    JOIN {right}.Nodes N2 ON N2.id = TM2.NodeID
+    WHERE N1.RecordID = ? AND N2.RecordID = ? AND T1.Name IS NOT NULL AND T1.Name != ''
+    ORDER BY T1.ID, T2.ID
+"""
+# В раздельной раскладке (см. db_maintenance.split_payloads) BLOB'ы лежат
+# в таблице TensorData, а Tensors содержит только метаданные.
+PAYLOAD_TABLE_INLINE = 'Tensors'
+PAYLOAD_TABLE_SPLIT = 'TensorData'
+# Файловая раскладка: BLOB'ы подряд лежат в '<capture>.payload', а Tensors.DataOffset
+# хранит смещение. Файл отображается через mmap и читается без копирования.
+PAYLOAD_FILE_SUFFIX = '.payload'
+TENSOR_OFFSET_QUERY = "SELECT DataOffset, DataSizeBytes FROM Tensors WHERE ID = ?"
+TENSOR_OFFSETS_QUERY = "SELECT ID, DataOffset, DataSizeBytes FROM Tensors WHERE ID IN ({placeholders}) ORDER BY DataOffset"
+TENSOR_BLOB_QUERY = "SELECT Data FROM {table} WHERE ID = ?"
+TENSOR_DIGEST_KEYS_QUERY = "SELECT ID, Name, Datatype, DataSizeBytes FROM Tensors ORDER BY ID"
+TENSOR_MAX_ID_QUERY = "SELECT MAX(ID) FROM Tensors"
+# Пакетная выборка: плейсхолдеры подставляются по размеру пачки, ORDER BY ID
+# даёт последовательное чтение страниц таблицы (ID — это rowid).
+TENSOR_BLOBS_QUERY = "SELECT ID, Data FROM {table} WHERE ID IN ({placeholders}) ORDER BY ID"
+BLOB_CHUNK_SIZE = 256
+
+# Настройки страницы/кэша для больших захватов (cache_size в KiB при отрицательном значении)
+CACHE_SIZE_KIB = 256 * 1024
+MMAP_SIZE_BYTES = 1024 * 1024 * 1024
+STATEMENT_CACHE_SIZE = 256
+
+
+class QueryStats:
+    """Счётчики времени выполнения запросов по их имени."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(lambda: {'calls': 0, 'rows': 0, 'seconds': 0.0})
+
+    def record(self, name, rows, seconds):
+        with self._lock:
+            counter = self._counters[name]
+            counter['calls'] += 1
+            counter['rows'] += rows
+            counter['seconds'] += seconds
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counter) for name, counter in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+    def format_report(self):
+        lines = []
+        for name, counter in sorted(self.snapshot().items()):
+            avg_ms = counter['seconds'] / counter['calls'] * 1000 if counter['calls'] else 0.0
+            lines.append(f"{name}: {counter['calls']} calls, {counter['rows']} rows, "
+                         f"{counter['seconds']:.3f}s total, {avg_ms:.2f}ms avg")
+        return "\n".join(lines) if lines else "No queries executed."
+
+
+class NodeColumns:
+    """Строки Nodes в виде типизированных столбцов вместо списка кортежей.
+
+    Имя узла хранится кодом (int32) в списке names; вместе со start/end
+    (float64) и record/seq (int64) это 36 байт на задачу.
+    """
+
+    def __init__(self, names, name_code, start, end, record, seq):
+        self.names = names
+        self.name_code, self.start, self.end = name_code, start, end
+        self.record, self.seq = record, seq
+
+    @classmethod
+    def allocate(cls, count):
+        return cls([], np.empty(count, dtype=np.int32), np.empty(count, dtype=np.float64),
+                   np.empty(count, dtype=np.float64), np.empty(count, dtype=np.int64),
+                   np.empty(count, dtype=np.int64))
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Столбцы из кортежей (Name, Start, End, RecordID, SeqNum)."""
+        columns = cls.allocate(len(rows))
+        columns.fill(0, rows, {})
+        return columns
+
+    def fill(self, offset, rows, codes):
+        """Записывает пачку строк начиная с offset; codes — {имя: код}, общий для всех пачек."""
+        if not rows:
+            return
+        names, start, end, record, seq = zip(*rows)
+        stop = offset + len(rows)
+        for name in names:
+            if name not in codes:
+                codes[name] = len(self.names)
+                self.names.append(name)
+        self.name_code[offset:stop] = [codes[name] for name in names]
+        self.start[offset:stop], self.end[offset:stop] = start, end
+        self.record[offset:stop], self.seq[offset:stop] = record, seq
+
+    def resize(self, count):
+        for attr in ('name_code', 'start', 'end', 'record', 'seq'):
+            column = getattr(self, attr)
+            resized = np.empty(count, dtype=column.dtype)
+            keep = min(count, len(column))
+            resized[:keep] = column[:keep]
+            setattr(self, attr, resized)
+
+    def __len__(self):
+        return len(self.start)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, attr).nbytes for attr in ('name_code', 'start', 'end', 'record', 'seq'))
+
+
+class TensorDatabase:
+    """Read-only доступ к файлу захвата, общий для всех вкладок приложения.
+
+    Соединение открывается один раз на поток (sqlite3 не разрешает делить
+    соединение между потоками) и живёт до вызова close(). Декодированные
+    тензоры делятся между вкладками через tensor_cache.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, cache_bytes=DEFAULT_CACHE_BYTES):
+        self.path = path
+        self.stats = QueryStats()
+        self.tensor_cache = TensorCache(cache_bytes)
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._payload_lock = threading.Lock()
+        self._payload_table = None
+        self._payload_mmap = None
+
+    # --- Соединения ---
+
+    def _connect(self):
+        uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        # В режиме mode=ro journal_mode сменить нельзя, но WAL-захват читается
+        # без блокировки писателя; query_only защищает от случайной записи.
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE_BYTES}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    @property
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Закрывает соединения всех потоков."""
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+        # mmap не закрываем явно: на него могут ссылаться ещё живые массивы-представления
+        self._payload_table = None
+        self._payload_mmap = None
+
+    # --- Раскладка хранения BLOB'ов ---
+
+    def _detect_payload_layout(self):
+        with self._payload_lock:
+            if self._payload_table is not None:
+                return
+            conn = self.connection
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(Tensors)")}
+            payload_path = self.path + PAYLOAD_FILE_SUFFIX
+            if 'DataOffset' in columns and os.path.exists(payload_path):
+                with open(payload_path, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size > 0:
+                        self._payload_mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    else:
+                        self._payload_mmap = b''
+                # Смещения хранятся в самой Tensors
+                self._payload_table = PAYLOAD_TABLE_INLINE
+                return
+            row = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (PAYLOAD_TABLE_SPLIT,)).fetchone()
+            self._payload_table = PAYLOAD_TABLE_SPLIT if row else PAYLOAD_TABLE_INLINE
+
+    @property
+    def payload_table(self):
+        """Таблица с BLOB'ами тензоров: TensorData в раздельной раскладке, иначе Tensors."""
+        self._detect_payload_layout()
+        return self._payload_table
+
+    @property
+    def zero_copy_payloads(self):
+        """True, если BLOB'ы читаются из отображённого в память файла без копирования."""
+        self._detect_payload_layout()
+        return self._payload_mmap is not None
+
+    def _payload_view(self, offset, size):
+        return memoryview(self._payload_mmap)[offset:offset + size]
+
+    # --- Выполнение запросов со счётчиками ---
+
+    def fetchall(self, name, sql, params=()):
+        started = time.perf_counter()
+        rows = self.connection.execute(sql, params).fetchall()
+        self.stats.record(name, len(rows), time.perf_counter() - started)
+        return rows
+
+    def fetchone(self, name, sql, params=()):
+        started = time.perf_counter()
+        row = self.connection.execute(sql, params).fetchone()
+        self.stats.record(name, 1 if row else 0, time.perf_counter() - started)
+        return row
+
+    # --- Запросы приложения ---
+
+    def fetch_nodes(self):
+        return self.fetchall('nodes', NODES_QUERY)
+
+    def _node_queries(self):
+        """(запрос COUNT(*), запрос Nodes, параметры) для каждого источника узлов."""
+        return [(NODES_COUNT_QUERY, NODES_QUERY, ())]
+
+    def fetch_node_columns(self):
+        """Nodes в NodeColumns: массивы выделяются по COUNT(*) и заполняются пачками fetchmany."""
+        started = time.perf_counter()
+        conn = self.connection
+        queries = self._node_queries()
+        count = sum(conn.execute(count_sql).fetchone()[0] for count_sql, _, _ in queries)
+        columns = NodeColumns.allocate(count)
+        codes, filled = {}, 0
+        for _, sql, params in queries:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(NODES_FETCH_SIZE)
+                if not rows:
+                    break
+                # Захват мог дописываться между COUNT(*) и выборкой
+                if filled + len(rows) > len(columns):
+                    columns.resize(max(filled + len(rows), 2 * len(columns)))
+                columns.fill(filled, rows, codes)
+                filled += len(rows)
+        if filled != len(columns):
+            columns.resize(filled)
+        self.stats.record('nodes', filled, time.perf_counter() - started)
+        return columns
+
+    def fetch_tensor_metadata(self):
+        return self.fetchall('tensor_metadata', TENSOR_METADATA_QUERY)
+
+    def fetch_tensor_digest_keys(self):
+        """(TensorID, Name, Datatype, DataSizeBytes) всех тензоров файла (основной схемы) по возрастанию ID."""
+        return self.fetchall('tensor_digest_keys', TENSOR_DIGEST_KEYS_QUERY)
+
+    def fetch_max_tensor_id(self):
+        return self.fetchone('tensor_max_id', TENSOR_MAX_ID_QUERY)[0]
+
+    def fetch_tensor_pairs(self, record1, record2):
+        """Строки TENSOR_PAIRS_QUERY для двух рекордов: (Name, ID1, ID2, Datatype, NumDims1, NumDims2, Shape0..4, DataSizeBytes)."""
+        sql = TENSOR_PAIRS_QUERY.format(left='main', right='main')
+        return self.fetchall('tensor_pairs', sql, (0, 0, record1, record2))
+
+    def database_for(self, tensor_id):
+        """(TensorDatabase, в файле которой лежит тензор, его TensorID в этом файле)."""
+        return self, tensor_id
+
+    def tensor_source(self, tensor_id):
+        """(абсолютный путь к файлу захвата, TensorID в этом файле) — ключ для внешних кэшей."""
+        db, local_id = self.database_for(tensor_id)
+        return os.path.abspath(db.path), local_id
+
+    def fetch_blob(self, tensor_id):
+        """BLOB тензора: bytes из БД или memoryview на отображённый файл payload."""
+        if self.zero_copy_payloads:
+            row = self.fetchone('tensor_offset', TENSOR_OFFSET_QUERY, (tensor_id,))
+            return self._payload_view(*row) if row else None
+        sql = TENSOR_BLOB_QUERY.format(table=self.payload_table)
+        row = self.fetchone('tensor_blob', sql, (tensor_id,))
+        return row[0] if row else None
+
+    def cache_tensor(self, tensor_id, tensor):
+        """Кладёт тензор в LRU-кэш; представления mmap не кэшируются — они и так бесплатны."""
+        if self.zero_copy_payloads:
+            return tensor
+        return self.tensor_cache.put(tensor_id, tensor)
+
+    def load_tensor(self, tensor_id, datatype, shape):
+        """Декодированный тензор по TensorID: из кэша или из БД (с добавлением в кэш).
+
+        В файловой раскладке возвращается read-only представление mmap без копирования.
+        """
+        tensor = self.tensor_cache.get(tensor_id)
+        if tensor is not None:
+            return tensor
+        blob = self.fetch_blob(tensor_id)
+        if blob is None:
+            return None
+        return self.cache_tensor(tensor_id, decode_tensor(blob, datatype, shape))
+
+    def iter_blobs(self, tensor_ids, chunk_size=BLOB_CHUNK_SIZE):
+        """Потоково отдаёт (ID, BLOB) пачками по chunk_size в порядке возрастания ID."""
+        ids = sorted(set(tensor_ids))
+        if self.zero_copy_payloads:
+            for i in range(0, len(ids), chunk_size):
+                chunk = ids[i:i + chunk_size]
+                sql = TENSOR_OFFSETS_QUERY.format(placeholders=",".join("?" * len(chunk)))
+                for tensor_id, offset, size in self.fetchall('tensor_offsets', sql, chunk):
+                    yield tensor_id, self._payload_view(offset, size)
+            return
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i:i + chunk_size]
+            sql = TENSOR_BLOBS_QUERY.format(table=self.payload_table, placeholders=",".join("?" * len(chunk)))
+            yield from self.fetchall('tensor_blobs', sql, chunk)
+
+
+def tensor_dtype(datatype):
+    """Тип NumPy для кода Datatype из таблицы Tensors."""
+    return np.float32 if datatype == 0 else np.int32
+
+
+def decode_tensor(blob, datatype, shape):
+    return np.frombuffer(blob, dtype=tensor_dtype(datatype)).reshape(shape)
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(path=DEFAULT_DB_PATH):
+    """Возвращает общий экземпляр TensorDatabase для файла (один на путь)."""
+    key = os.path.abspath(path)
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = TensorDatabase(path)
+            _databases[key] = db
+        return db
+
+
+def close_all_databases():
+    with _databases_lock:
+        for db in _databases.values():
+            db.close()
+        _databases.clear()
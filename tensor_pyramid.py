@@ -0,0 +1,78 @@
+import numpy as np
+from skimage.measure import block_reduce  # Для max/min-пулинга
+
+# =====================================================================================
+#  Пирамида max/min-пулинга для больших 2D-срезов в TensorViewer
+# =====================================================================================
+
+# Срезы меньше этого числа элементов показываются как есть, без пирамиды
+PYRAMID_MIN_PIXELS = 2048 * 2048
+# Пирамида строится, пока верхний уровень больше этого размера по любой оси
+PYRAMID_TOP_SIZE = 512
+
+
+def _window_bounds(lim, factor, size):
+    """Индексы [start, stop) ячеек уровня, покрывающих видимый диапазон координат среза."""
+    lo, hi = min(lim), max(lim)
+    start = int(np.clip(np.floor((lo + 0.5) / factor), 0, size - 1))
+    stop = int(np.clip(np.ceil((hi + 0.5) / factor), start + 1, size))
+    return start, stop
+
+
+def _extent(x0, x1, y0, y1, factor, shape):
+    """extent для imshow в координатах исходного среза (последний блок может быть неполным)."""
+    h, w = shape
+    return (x0 * factor - 0.5, min(x1 * factor, w) - 0.5, min(y1 * factor, h) - 0.5, y0 * factor - 0.5)
+
+
+def strided_preview(data, max_size=PYRAMID_TOP_SIZE):
+    """Быстрый прореженный срез, который показывается, пока строится пирамида."""
+    step = max(1, int(np.ceil(max(data.shape) / max_size)))
+    preview = data[::step, ::step]
+    return preview, _extent(0, preview.shape[1], 0, preview.shape[0], step, data.shape)
+
+
+class PoolingPyramid:
+    """Пирамида 2D-среза: уровень k хранит максимум и минимум блоков 2**k x 2**k.
+
+    Уровни строятся один раз (каждый — из предыдущего, суммарно ~4/3 размера
+    среза), после чего отрисовка любого вида стоит O(пикселей экрана): берётся
+    уровень, соответствующий числу элементов на пиксель, и из него вырезается
+    видимое окно. Хранение и максимума, и минимума не даёт потерять одиночные
+    выбросы любого знака.
+    """
+
+    def __init__(self, data, is_cancelled=lambda: False):
+        data = np.asarray(data)
+        self.shape = data.shape
+        self.levels = [(data, data)]
+        # Заполнители для неполных блоков на краях: не влияют на max и min
+        low, high = data.min(), data.max()
+        while max(self.levels[-1][0].shape) > PYRAMID_TOP_SIZE and not is_cancelled():
+            prev_max, prev_min = self.levels[-1]
+            self.levels.append((block_reduce(prev_max, block_size=(2, 2), func=np.max, cval=low),
+                                block_reduce(prev_min, block_size=(2, 2), func=np.min, cval=high)))
+
+    def level_for(self, data_per_pixel):
+        """Самый грубый уровень, у которого на пиксель экрана приходится не меньше одной ячейки."""
+        level = int(np.floor(np.log2(max(data_per_pixel, 1.0))))
+        return min(level, len(self.levels) - 1)
+
+    def window(self, level, xlim, ylim):
+        """Возвращает (данные, extent) видимого окна уровня.
+
+        На уровнях > 0 в каждой ячейке показывается то из max/min блока, что
+        больше по модулю; для неотрицательных данных (разностей) это максимум.
+        """
+        factor = 1 << level
+        block_max, block_min = self.levels[level]
+        h, w = block_max.shape
+        x0, x1 = _window_bounds(xlim, factor, w)
+        y0, y1 = _window_bounds(ylim, factor, h)
+        window_max = block_max[y0:y1, x0:x1]
+        if level == 0:
+            data = window_max
+        else:
+            window_min = block_min[y0:y1, x0:x1]
+            data = np.where(np.abs(window_min) > np.abs(window_max), window_min, window_max)
+        return data, _extent(x0, x1, y0, y1, factor, self.shape)
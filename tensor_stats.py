@@ -0,0 +1,98 @@
+import numpy as np
+
+# =====================================================================================
+#  Статистика тензора для цветовой шкалы TensorViewer: считается один раз на тензор
+# =====================================================================================
+
+# Размер блока (в элементах), которым тензор читается при подсчёте статистики
+STATS_CHUNK_ELEMENTS = 1 << 22
+# Перцентили считаются по равномерной выборке примерно такого размера
+PERCENTILE_SAMPLE_SIZE = 1 << 20
+ROBUST_PERCENTILES = (1.0, 99.0)
+
+
+class TensorStats:
+    """min/max тензора — общие и по каждой оси — и перцентили для робастной шкалы.
+
+    axis_min[a][i] / axis_max[a][i] — экстремумы гиперплоскости tensor[..., i, ...]
+    по оси a. Любой 2D-срез лежит в пересечении гиперплоскостей зафиксированных
+    осей, поэтому его значения гарантированно внутри slice_limits().
+    """
+
+    def __init__(self, axis_min, axis_max, percentiles):
+        self.axis_min = axis_min
+        self.axis_max = axis_max
+        self.global_min = float(axis_min[0].min())
+        self.global_max = float(axis_max[0].max())
+        self.percentiles = tuple(float(p) for p in percentiles)
+
+    @property
+    def nbytes(self):
+        # Для учёта в TensorCache
+        return sum(a.nbytes for a in self.axis_min) + sum(a.nbytes for a in self.axis_max)
+
+    def slice_limits(self, fixed):
+        """Границы среза по зафиксированным осям: fixed — {ось: индекс}."""
+        if not fixed:
+            return self.global_min, self.global_max
+        vmin = max(self.axis_min[axis][index] for axis, index in fixed.items())
+        vmax = min(self.axis_max[axis][index] for axis, index in fixed.items())
+        return float(vmin), float(vmax)
+
+
+def _iter_blocks(tensor, chunk_elements):
+    """Выдаёт (префикс индекса, блок), покрывающие тензор ровно один раз.
+
+    ndarray режется на блоки строк по оси 0 (префикс — slice). Ленивые
+    тензоры (BlobTensor, DiffTensor) индексируются только целыми числами,
+    поэтому для них фиксируется столько ведущих осей, сколько нужно, чтобы
+    блок уместился в chunk_elements.
+    """
+    shape = tensor.shape
+    if isinstance(tensor, np.ndarray):
+        row_size = max(1, int(np.prod(shape[1:], dtype=np.int64)))
+        rows = max(1, chunk_elements // row_size)
+        for start in range(0, shape[0], rows):
+            yield (slice(start, min(start + rows, shape[0])),), tensor[start:start + rows]
+        return
+    leading = 0
+    while leading < len(shape) - 1 and np.prod(shape[leading:], dtype=np.int64) > chunk_elements:
+        leading += 1
+    for prefix in np.ndindex(*shape[:leading]):
+        yield prefix, np.asarray(tensor[prefix])
+
+
+def compute_tensor_stats(tensor, is_cancelled=lambda: False, chunk_elements=STATS_CHUNK_ELEMENTS):
+    """Один проход по тензору блоками: min/max по всем осям и выборка для перцентилей.
+
+    Возвращает TensorStats или None, если расчёт отменён.
+    """
+    shape = tensor.shape
+    axis_min = [np.full(dim, np.inf) for dim in shape]
+    axis_max = [np.full(dim, -np.inf) for dim in shape]
+    size = int(np.prod(shape, dtype=np.int64))
+    sample_step = max(1, size // PERCENTILE_SAMPLE_SIZE)
+    samples = []
+
+    for prefix, block in _iter_blocks(tensor, chunk_elements):
+        if is_cancelled():
+            return None
+        if block.size == 0:
+            continue
+        # Оси, зафиксированные целым индексом, целиком принадлежат одной гиперплоскости
+        fixed = sum(1 for p in prefix if not isinstance(p, slice))
+        block_min, block_max = block.min(), block.max()
+        for axis in range(fixed):
+            index = prefix[axis]
+            axis_min[axis][index] = min(axis_min[axis][index], block_min)
+            axis_max[axis][index] = max(axis_max[axis][index], block_max)
+        for axis in range(fixed, len(shape)):
+            block_axis = axis - fixed
+            other = tuple(a for a in range(block.ndim) if a != block_axis)
+            target = prefix[axis] if axis < len(prefix) else slice(None)
+            np.minimum(axis_min[axis][target], block.min(axis=other), out=axis_min[axis][target])
+            np.maximum(axis_max[axis][target], block.max(axis=other), out=axis_max[axis][target])
+        samples.append(block.ravel()[::sample_step])
+
+    sample = np.concatenate(samples) if samples else np.zeros(1)
+    return TensorStats(axis_min, axis_max, np.percentile(sample, ROBUST_PERCENTILES))